@@ -0,0 +1,128 @@
+"""Server-side timing of a bot run.
+
+From the project folder,
+
+    python -m _shared.bot_timing <session_config> [--participants N] [--csv FILE]
+
+creates a session of the config in an in-memory database, like `otree test`, plays it
+with the apps' bots (see bots.py) and times every request to a participant page on the
+server side. Then it prints:
+  - per Page / WaitPage: number of requests, total, mean and max server time
+  - per app and round: requests per participant
+--csv also writes one row per request (participant, app, round, page, kind, method,
+milliseconds). The journal replay takes --timing to do the same for a recorded session
+(see journal.py). Plain `otree test` runs are never timed.
+"""
+import argparse
+import csv
+import os
+import time
+from collections import defaultdict
+
+
+class _TimedApp:
+    """Wraps the oTree ASGI app and records how long each participant page request takes."""
+
+    def __init__(self, app, records):
+        self.app = app
+        self.records = records
+        self.session_codes = {}
+
+    def __getattr__(self, name):
+        return getattr(self.app, name)
+
+    async def __call__(self, scope, receive, send):
+        start = time.perf_counter()
+        await self.app(scope, receive, send)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if scope['type'] == 'http':
+            self.record(scope['path'], scope['method'], elapsed_ms)
+
+    def record(self, path, method, elapsed_ms):
+        from otree.api import WaitPage
+
+        from _shared import otree_internals
+
+        found = otree_internals.page_index_in_path(path)
+        if found is None:
+            return
+        code, idx = found
+        if code not in self.session_codes:
+            self.session_codes[code] = otree_internals.session_code_of(code)
+        app_name, page_class, round_number = otree_internals.page_at(self.session_codes[code], idx)
+        kind = 'WaitPage' if issubclass(page_class, WaitPage) else 'Page'
+        self.records.append((code, app_name, round_number, page_class.__name__, kind, method, elapsed_ms))
+
+
+def start():
+    """Call after otree.main.setup() and before the bots run: times every request the bots
+    make from then on. Returns the list the records are appended to, one per request:
+    (participant code, app, round, page, kind, method, ms)."""
+    from _shared import otree_internals
+    records = []
+    otree_internals.wrap_test_client_app(lambda app: _TimedApp(app, records))
+    return records
+
+
+def report(records, csv_path=None):
+    if not records:
+        return
+    by_page = defaultdict(list)
+    by_round = defaultdict(lambda: defaultdict(int))
+    for code, app, round_number, page, kind, method, ms in records:
+        by_page[(app, page, kind)].append(ms)
+        by_round[(app, round_number)][code] += 1
+
+    print()
+    print('Bot timing report (server time per request, ms)')
+    print(f"{'app':<28} {'page':<24} {'kind':<9} {'requests':>8} {'total':>9} {'mean':>7} {'max':>7}")
+    for (app, page, kind), times in by_page.items():
+        print(
+            f'{app:<28} {page:<24} {kind:<9} {len(times):>8} {sum(times):>9.1f} '
+            f'{sum(times) / len(times):>7.1f} {max(times):>7.1f}'
+        )
+    print()
+    print('Requests per participant per round')
+    print(f"{'app':<28} {'round':>5} {'participants':>12} {'mean':>6} {'max':>5}")
+    for (app, round_number), counts in sorted(by_round.items()):
+        values = list(counts.values())
+        print(
+            f'{app:<28} {round_number:>5} {len(values):>12} '
+            f'{sum(values) / len(values):>6.1f} {max(values):>5}'
+        )
+
+    if csv_path:
+        with open(csv_path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['participant_code', 'app', 'round_number', 'page', 'kind', 'method', 'ms'])
+            writer.writerows(records)
+        print(f'Per-request timings written to {csv_path}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a session with the bots and time the server's requests.")
+    parser.add_argument('session_config')
+    parser.add_argument('--participants', type=int, help="default: the config's num_demo_participants")
+    parser.add_argument('--csv', metavar='FILE', help='also write one row per request to FILE')
+    args = parser.parse_args()
+
+    # Like `otree test`: the run never touches the server's database
+    os.environ['OTREE_IN_MEMORY'] = '1'
+    from otree.main import setup
+    setup()
+    from otree.bots.runner import run_bots
+    from otree.session import SESSION_CONFIGS_DICT, create_session
+
+    if args.session_config not in SESSION_CONFIGS_DICT:
+        parser.error(f"no session config named {args.session_config}")
+    config = SESSION_CONFIGS_DICT[args.session_config]
+    session = create_session(
+        args.session_config, num_participants=args.participants or config['num_demo_participants']
+    )
+    records = start()
+    run_bots(session.id)
+    report(records, args.csv)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""Shared bot suite for the apps' tests.py files.
+
+make_player_bot() builds a PlayerBot from an app's page_sequence and form_fields.
+Instead of predicting is_displayed(), the bot checks which page the participant is
+actually on, so role- and state-dependent pages (Stage2Decision, VotingPage,
+Offer/Respond, ...) are submitted exactly when the server shows them. Form values
+come from the field definitions (choices, min/max, type) unless the app passes a
+role-aware function for the field.
+
+Pass checks to have the bots verify the app's data after each round, e.g. that the
+payoffs match the ledgers, the reps' terms follow the rules and the export stops where
+the game did (check_ledger(), check_terms(), check_export(), ...; see the apps' tests.py). play_sliders() and play_votes() play the
+live pages of the treatment apps.
+Pass cases and gone to also play participants whose browser is gone: they let every
+page time out and send no live messages, as when someone leaves the lab.
+To time the server's requests while the bots play, see bot_timing.py.
+
+In a session replaying a journal (see journal.py) the bots submit the journaled forms
+and timeouts and send the journaled live messages instead.
+"""
+import random
+
+from otree.api import Bot, Submission, WaitPage
+
+from _shared import dropout_engine, journal, otree_internals, rotation_checkpoint, rotation_engine, rotation_export, slider_engine
+
+
+def make_player_bot(page_sequence, choices=None, timeouts=(), no_button=(), live=None, checks=(), cases=(), gone=None):
+    """Returns a PlayerBot class for an app.
+    choices maps a form field name to a value, or to a function taking the player
+    and returning the value. Pages in timeouts are submitted as if their timer ran
+    out, the way the SliderTask page ends in the lab. Pages in no_button have no
+    next button (e.g. final results) and are submitted without the HTML check, so
+    the bots can carry on to the next app. live maps a page with a live_method to a
+    function(page_class, group) that plays it for the group before the bots submit.
+    checks are functions taking the bot, run once it has played each round; they raise
+    AssertionError when the app's data is wrong. cases are the bot cases to play (oTree
+    runs a session per case), and gone(player, case) returns True for a participant whose
+    browser is gone in that case: their bot lets every page time out, and the live
+    functions skip them (see is_gone())."""
+    choices = choices or {}
+    _live_players.update({page: (play, gone) for page, play in (live or {}).items()})
+    pages = [page for page in page_sequence if not issubclass(page, WaitPage)]
+
+    class PlayerBot(Bot):
+        def play_round(self):
+            is_gone = gone is not None and gone(self.player, self.case)
+            for page in pages:
+                if not self._is_on(page):
+                    # is_displayed() returned False for this participant
+                    continue
+                replay = journal.get_replay()
+                if replay:
+                    entry = replay.get_submit(self.player, page)
+                    data = {field: value for field, value in entry['submit'].items() if value is not None}
+                    yield Submission(page, data, timeout_happened=entry['timeout'], check_html=False)
+                    continue
+                data = {field: self._choose(field) for field in getattr(page, 'form_fields', None) or []}
+                if page in timeouts or is_gone:
+                    yield Submission(page, data, timeout_happened=True, check_html=False)
+                elif page in no_button:
+                    yield Submission(page, data, check_html=False)
+                else:
+                    yield Submission(page, data)
+            for check in checks:
+                _run_check(check, self)
+
+        def _is_on(self, page):
+            on = otree_internals.bot_page(self.participant_bot)
+            return on is not None and on[1] is page and on[2] == self.round_number
+
+        def _choose(self, field):
+            if field in choices:
+                choice = choices[field]
+                return choice(self.player) if callable(choice) else choice
+            return _default_value(type(self.player).__table__.columns[field])
+
+    PlayerBot.cases = list(cases)
+    return PlayerBot
+
+
+def _run_check(check, bot):
+    """Runs check(bot) in a database session of its own, so the check reads what the
+    server committed and leaves whatever the bots' session has loaded untouched."""
+    otree_internals.run_in_new_db_session(check, bot)
+
+
+# oTree looks for call_live_method in the module the PlayerBot class was defined in,
+# which for the generated bots is this one, so it dispatches to the apps' functions.
+# page -> (live function, gone function of the app)
+_live_players = {}
+# The case and gone function of the live function being played, for is_gone()
+_live_case = {}
+
+
+def call_live_method(method, page_class, group, **kwargs):
+    # The bots' database session outlives the requests, so what it loaded earlier may
+    # be stale; reload it, or the live method would write the stale session.vars back.
+    otree_internals.expire_all()
+    replay = journal.get_replay()
+    if replay:
+        replay.play_live(page_class, group)
+    elif page_class in _live_players:
+        play, gone = _live_players[page_class]
+        _live_case.update(case=kwargs.get('case'), gone=gone)
+        play(page_class, group)
+
+
+def is_gone(player):
+    """For the live functions: the bots play player's browser as gone, so it sends nothing."""
+    gone = _live_case.get('gone')
+    return gone is not None and gone(player, _live_case.get('case'))
+
+
+def check_ledger(bot):
+    """After each round: the participant's ledger must hold exactly the payoffs of their
+    player rows in the app. All rounds count, since the participant may already be past
+    the next round's payoffs (e.g. a recipient who skips the Offer page)."""
+    player = bot.player
+    Player = type(player)
+    earned = sum(float(p.payoff) for p in Player.objects_filter(participant_id=player.participant_id))
+    app_name = player.get_folder_name()
+    in_ledger = float(bot.participant.vars.get('app_payoffs', {}).get(app_name, 0))
+    if abs(in_ledger - earned) > 1e-6:
+        raise AssertionError(
+            f'{app_name} participant {player.participant_id} after round {player.round_number}: '
+            f'the ledger holds {in_ledger}, the player rows paid {earned}'
+        )
+
+
+def check_history(bot):
+    """After each round: replays the bot's participant's history through the app's
+    checkpoints (see rotation_checkpoint.py) and checks it against their player rows. At the start of each round,
+    the cohort's ledger must hold exactly their payoffs of the earlier rounds, and once
+    removed from office they must never be rep or in the pool again. An older copy of the
+    state written back over the current one breaks both.
+    Reads the Subsession and Player rows only, never the Session."""
+    player = bot.player
+    Player = type(player)
+    Subsession = type(bot.subsession)
+    pid = player.participant_id
+    rows = Player.objects_filter(participant_id=pid).order_by(Player.round_number)
+    payoffs = {p.round_number: float(p.payoff) for p in rows}
+    subsessions = Subsession.objects_filter(session_id=player.session_id).order_by(Subsession.round_number)
+    removed_in = None
+    for subsession in subsessions:
+        if subsession.round_number > player.round_number:
+            break
+        if not subsession.rotation_checkpoint:
+            continue
+        round_number = subsession.round_number
+        cohorts, cohort_of = rotation_checkpoint.loads(subsession.rotation_checkpoint)
+        cohort = cohorts[cohort_of[pid]]
+        where = f'{player.get_folder_name()} participant {pid} at the start of round {round_number}'
+        earned = sum(payoff for n, payoff in payoffs.items() if n < round_number)
+        in_ledger = float(cohort['payoff_ledger'].get(pid, 0))
+        if abs(in_ledger - earned) > 1e-6:
+            raise AssertionError(f'{where}: the ledger holds {in_ledger}, the earlier rounds paid {earned}')
+        if removed_in is None and pid in cohort['removed_pids']:
+            removed_in = round_number
+        if removed_in is not None:
+            if pid not in cohort['removed_pids']:
+                raise AssertionError(f'{where}: removed in round {removed_in}, no longer listed as removed')
+            # A game that ended in the round its rep was removed promotes nobody, so the
+            # removed rep stays the cohort's last rep
+            back_as_rep = cohort['current_rep_pid'] == pid and not cohort['game_over']
+            if back_as_rep or pid in cohort['rep_pool']:
+                raise AssertionError(f'{where}: removed in round {removed_in}, back as rep or in the pool')
+
+
+def check_terms(term_limit=None):
+    """Returns a check of the bot's participant's terms in office, read from their
+    player rows. A rep who left office is never rep
+    again, and no term lasts longer than term_limit rounds, if given."""
+    def check(bot):
+        player = bot.player
+        Player = type(player)
+        rows = Player.objects_filter(participant_id=player.participant_id).order_by(Player.round_number)
+        served = 0
+        left_in = None
+        for p in rows:
+            if p.round_number > player.round_number:
+                break
+            where = f'{player.get_folder_name()} participant {player.participant_id} in round {p.round_number}'
+            if not p.is_active_rep:
+                if served and left_in is None:
+                    left_in = p.round_number
+                continue
+            if left_in is not None:
+                raise AssertionError(f'{where}: rep again after leaving office in round {left_in}')
+            served += 1
+            if term_limit and served > term_limit:
+                raise AssertionError(f'{where}: rep for {served} rounds in a row, the term limit is {term_limit}')
+    return check
+
+
+def check_export(custom_export):
+    """Returns a check of the app's custom_export (see rotation_export.py) once the bot's
+    cohort's game has ended: it must hold the participant's rows of every round up to
+    the one the game ended in, and none of the rounds after it."""
+    def check(bot):
+        player = bot.player
+        if player.field_maybe_none('cohort') is None:
+            # a round lazy_rounds never set up, since no cohort's game reached it (see round_engine)
+            return
+        end_round = rotation_engine.get_status(player).end_round
+        if end_round is None:
+            return
+        Player = type(player)
+        players = Player.objects_filter(participant_id=player.participant_id).order_by(Player.id)
+        column = rotation_export.HEADER.index('round_number')
+        rounds = [row[column] for row in list(custom_export(players))[1:]]
+        if rounds != list(range(1, end_round + 1)):
+            raise AssertionError(
+                f'{player.get_folder_name()} participant {player.participant_id}: the game ended in '
+                f'round {end_round}, the export has rounds {rounds}'
+            )
+    return check
+
+
+def check_dropout(gone):
+    """Returns a check for a participant the bots play as gone(player, case). Once they have let dropout_missed_pages SliderTask pages
+    time out, they must hold no seat from the next round on, and a rep still in office
+    then must be listed in that round's substitutions. Reads the player and subsession rows."""
+    def check(bot):
+        player = bot.player
+        threshold = bot.session.config.get('dropout_missed_pages', dropout_engine.DEFAULT_MISSED_PAGES)
+        if not threshold or not gone(player, bot.case):
+            return
+        Player = type(player)
+        rows = Player.objects_filter(participant_id=player.participant_id).order_by(Player.round_number)
+        num_missed = 0
+        previous = None
+        for p in rows:
+            if p.round_number > player.round_number:
+                break
+            where = f'{player.get_folder_name()} participant {player.participant_id} in round {p.round_number}'
+            if num_missed >= threshold:
+                if p.is_voter or p.is_active_rep:
+                    raise AssertionError(f'{where}: still active after {num_missed} missed SliderTask pages')
+                in_office = previous.is_active_rep and not previous.group.rep_was_removed_this_round
+                if in_office and f':rep:{player.participant_id}:' not in p.subsession.substitutions:
+                    raise AssertionError(f'{where}: dropped out in office, but not substituted')
+            if p.is_voter or p.is_active_rep:
+                num_missed += 1
+            previous = p
+    return check
+
+
+def play_sliders(page_class, group):
+    """Live function of the SliderTask: every player in the group sends a few forged
+    answers, which must be ignored, then answers a full batch of sliders and part of the
+    next, as the browser sends them when the page ends. The
+    bots answer far faster than a person, so before each batch the player's clock fields
+    are moved back by the time a participant would have taken. Calls the page's
+    live_method directly, because the `method` oTree hands to call_live_method is an
+    async generator in newer oTree versions. Players the bots play as gone send nothing."""
+    for p in group.get_players():
+        if is_gone(p):
+            continue
+        reply = page_class.live_method(p, dict(type='load'))[p.id_in_group]
+        index, goal = reply['goals'][0]
+        # Answers that are malformed, or faster than the time since the goals were revealed, are ignored
+        for forged in [[[index, goal, 900]], [[index, goal, 0]], [[index, 'x', 900]], [[index, None, 900]], 'x']:
+            forged_reply = page_class.live_method(p, dict(type='attempts', attempts=forged))[p.id_in_group]
+            if forged_reply['goals'][0][0] != index:
+                raise AssertionError(f'{p.get_folder_name()} player {p.id}: SliderTask accepted {forged}')
+        for num_answers in [slider_engine.GOALS_AHEAD, 2]:
+            attempts = [
+                [index, goal if random.random() < 0.7 else slider_engine.SLIDER_MIN, random.randint(800, 4000)]
+                for index, goal in reply['goals'][:num_answers]
+            ]
+            taken = (num_answers * slider_engine.NEXT_GOAL_DELAY_MS + sum(a[2] for a in attempts)) / 1000
+            p.slider_started_at -= taken
+            p.slider_shown_at -= taken
+            reply = page_class.live_method(p, dict(type='attempts', attempts=attempts))[p.id_in_group]
+
+
+def play_votes(choose=None):
+    """Returns a live function for the VotingPage that has every voter in the group
+    vote, with choose(player, case) deciding the vote (random if not given). Voters the
+    bots play as gone do not vote."""
+    def play(page_class, group):
+        for p in group.get_players():
+            if p.is_voter and not is_gone(p):
+                replace = choose(p, _live_case.get('case')) if choose else random.choice([True, False])
+                page_class.live_method(p, dict(replace=replace))
+    return play
+
+
+def _default_value(column):
+    form_props = column.form_props
+    if form_props.get('choices'):
+        choice = random.choice(form_props['choices'])
+        return choice[0] if isinstance(choice, (list, tuple)) else choice
+    python_type = column.type.python_type
+    if python_type is bool:
+        return random.choice([True, False])
+    if python_type in (int, float):
+        low = form_props.get('min', 0)
+        high = form_props.get('max', low + 10)
+        return python_type(random.randint(int(low), int(high)))
+    return 'Bot'
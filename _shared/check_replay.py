@@ -0,0 +1,73 @@
+"""Replay check of the input journal (see journal.py).
+
+From the project folder,
+
+    python -m _shared.check_replay [session_config] [--participants N]
+
+plays a session of the config (default debug_treatment_1, whose rounds all have a
+SliderTask) with the apps' bots in an in-memory database, journaling the bots as if
+they were participants, then replays the journal on a new session and checks that
+every submission, and every payoff with it, comes out the same. Exits with an error
+at the first difference.
+"""
+import argparse
+import os
+import tempfile
+
+DEFAULT_CONFIG = 'debug_treatment_1'
+
+
+def record_session(config_name, num_participants, journal_dir):
+    """Plays a session of the config with the bots, journaled to journal_dir. Returns the journal's path."""
+    from otree.bots.runner import run_bots
+    from otree.session import SESSION_CONFIGS_DICT, create_session
+
+    from _shared import journal
+
+    config = SESSION_CONFIGS_DICT[config_name]
+    session = create_session(
+        config_name, num_participants=num_participants or config['num_demo_participants'],
+        modified_session_config_fields=dict(journal=True, journal_dir=journal_dir),
+    )
+    journal.journal_bots = True
+    try:
+        run_bots(session.id)
+    finally:
+        journal.journal_bots = False
+    return journal.get_path(session)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record a bot session in the journal and replay it.')
+    parser.add_argument('config', nargs='?', default=DEFAULT_CONFIG)
+    parser.add_argument('--participants', type=int, help="default: the config's num_demo_participants")
+    args = parser.parse_args()
+
+    os.environ['OTREE_IN_MEMORY'] = '1'
+    from otree.main import setup
+    setup()
+    from otree.session import SESSION_CONFIGS_DICT
+
+    from _shared import journal
+
+    if args.config not in SESSION_CONFIGS_DICT:
+        parser.error(f'no session config named {args.config}')
+
+    with tempfile.TemporaryDirectory() as journal_dir:
+        path = record_session(args.config, args.participants, journal_dir)
+        header, entries = journal.read(path)
+        sliders = [e for e in entries if e['page'] == 'SliderTask' and 'live' in e]
+        if not sliders:
+            raise SystemExit(f'{args.config} journaled no slider messages, so the replay would not cover them')
+        try:
+            replay, elapsed = journal.replay_session(path)
+        except AssertionError as e:
+            raise SystemExit(str(e))
+    print(
+        f"Recorded and replayed {args.config} ({header['participants']} participants): "
+        f'{len(replay.submits):,} submissions and {len(sliders):,} slider messages in {elapsed:.1f}s, all checks passed'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+from otree.api import *
+import time
+
+# Dropout detection for the rotation apps.
+# Every page a participant submits themselves and every live message their browser
+# sends (the slider task loads its goals over the live channel, votes arrive the same
+# way) is a heartbeat. The SliderTask page is the regular check: every active player
+# sees it every round, and a browser that shows it sends a 'load' live message at once,
+# so a SliderTask that times out without a single live message from its player is a
+# missed heartbeat. So is a decision page (vote, Stage 2) that was submitted by its
+# timeout. When the browser is gone, oTree's timeout worker keeps submitting the
+# participant's pages, so the session never stalls, but each round still waits out
+# their timers. Status and results pages only count when submitted: a participant still
+# reading one when its timer runs out is slow, not gone, and an inactive player sees
+# nothing but these. After `dropout_missed_pages` missed heartbeats in a row the
+# participant counts as dropped, and rotation_engine.substitute_dropouts() takes them
+# out of their cohort at the start of the next round (see there).
+#
+# The counters live in participant.vars, so they carry across the treatment apps.
+#
+# Session config:
+#   dropout_missed_pages  missed heartbeats in a row that count as a dropout (default 3, 0 turns detection off)
+
+DEFAULT_MISSED_PAGES = 3
+
+
+def heartbeat(player: BasePlayer):
+    """The participant's browser is there. Call from live_methods and on submitted pages."""
+    participant = player.participant
+    participant.vars['missed_pages'] = 0
+    participant.vars['last_heartbeat'] = round(time.time())
+
+
+def missed(player: BasePlayer):
+    participant = player.participant
+    participant.vars['missed_pages'] = participant.vars.get('missed_pages', 0) + 1
+
+
+def record_page(player: BasePlayer, timeout_happened):
+    """Call from before_next_page of every decision page."""
+    if timeout_happened:
+        missed(player)
+    else:
+        heartbeat(player)
+
+
+def record_slider_page(player: BasePlayer, timeout_happened):
+    """Call from before_next_page of the SliderTask pages. The page ends on its timer,
+    so only a timeout before the browser sent any live message (slider_started_at is
+    still None, see slider_engine) is a missed heartbeat."""
+    if timeout_happened and player.field_maybe_none('slider_started_at') is None:
+        missed(player)
+    else:
+        heartbeat(player)
+
+
+def record_info_page(player: BasePlayer, timeout_happened):
+    """Call from before_next_page of every status and results page: a heartbeat if the
+    participant submitted it, while its timeout is not a missed one."""
+    if not timeout_happened:
+        heartbeat(player)
+
+
+def is_dropped(participant, session):
+    threshold = session.config.get('dropout_missed_pages', DEFAULT_MISSED_PAGES)
+    return bool(threshold) and participant.vars.get('missed_pages', 0) >= threshold
@@ -0,0 +1,189 @@
+"""Monte Carlo forecast of session length and payout for the rotation treatments.
+
+Simulates many sessions of a treatment app at once with NumPy, using the app's C
+constants (NUM_ROUNDS, NUM_VOTERS, TERM_LIMIT, REP_SALARY, STAGE_2_COST, multipliers,
+indefinite horizon, chaos probability) and assumed participant behaviour, and reports the
+distribution of rounds played, reps used and total payout per session. Meant for
+sizing lab bookings and budgets; it is not used by the apps at runtime.
+
+Needs numpy, which is in requirements.txt. Run from the project folder, e.g.:
+
+    python -m _shared.forecast
+    python -m _shared.forecast app_5_treatment2b --participants 14 --num-cohorts 2
+    python -m _shared.forecast --replace-prob 0.3 --stage2 0.2 0.5 0.3 --sessions 5000000
+
+Each cohort is simulated independently, as in the apps: a session lasts as long as its
+longest-running cohort, and its reps and payout are summed over its cohorts.
+Slider scores are drawn from a Poisson distribution with mean --slider-mean per player
+and round, each voter votes to replace with probability --replace-prob, and a leaving
+rep picks Sabotage / Neutral / Help with the --stage2 probabilities.
+"""
+import argparse
+import importlib
+import time
+
+import numpy as np
+
+import settings
+from _shared import vote_engine
+
+# How each treatment removes its rep and whether it has the indefinite horizon.
+# The apps with a term limit define it as C.TERM_LIMIT.
+TREATMENTS = {
+    'app_3_treatment1': dict(vote=False, horizon=False, chaos=False),
+    'app_4_treatment2a': dict(vote=True, horizon=True, chaos=False),
+    'app_5_treatment2b': dict(vote=True, horizon=True, chaos=True),
+    'app_6_treatment3': dict(vote=True, horizon=True, chaos=False),
+}
+
+# Stage 2 decisions in the order of the --stage2 probabilities, with their multiplier factor
+STAGE2_FACTORS = np.array([0.5, 1.0, 1.5])  # Sabotage, Neutral, Help
+NEUTRAL = 1
+
+
+def cohort_pool_sizes(participants, num_cohorts, num_voters):
+    """Rep pool size of each cohort, dealt the way rotation_engine.create_cohorts does."""
+    sizes = np.array([len(range(index, participants, num_cohorts)) for index in range(num_cohorts)])
+    pool_sizes = sizes - num_voters
+    if (pool_sizes < 1).any():
+        raise ValueError(
+            f'{num_cohorts} cohorts need at least {num_cohorts * (num_voters + 1)} participants, got {participants}.'
+        )
+    return pool_sizes
+
+
+def simulate(app_name, num_sessions, participants, num_cohorts, replace_prob, stage2_probs, slider_mean, vote_rule, rng):
+    """Simulates num_sessions sessions of one app. Returns per-session arrays
+    (rounds_played, reps_used, payout), payout in points."""
+    C = importlib.import_module(app_name).C
+    treatment = TREATMENTS[app_name]
+    term_limit = getattr(C, 'TERM_LIMIT', None)
+    rule = vote_engine.RULES[vote_rule]
+    shape = (num_sessions, num_cohorts)
+
+    reps_left = np.broadcast_to(cohort_pool_sizes(participants, num_cohorts, C.NUM_VOTERS) - 1, shape).copy()
+    active = np.ones(shape, dtype=bool)
+    term_start = np.ones(shape, dtype=np.int64)
+    voter_multiplier = np.full(shape, float(C.BASE_VOTER_SUCCESS_PAYOFF))
+    rep_multiplier = np.full(shape, float(C.BASE_REP_SUCCESS_PAYOFF))
+    rounds_played = np.zeros(shape, dtype=np.int64)
+    reps_used = np.ones(shape, dtype=np.int64)
+    payout = np.zeros(shape)
+
+    for round_number in range(1, C.NUM_ROUNDS + 1):
+        rounds_played += active
+
+        # PayoffWaitPage: voters share the pot, the rep gets the salary
+        rep_score = rng.poisson(slider_mean, shape)
+        voter_scores = rng.poisson(slider_mean * C.NUM_VOTERS, shape)
+        pot = rep_score * rep_multiplier + voter_scores * voter_multiplier
+        payout += np.where(active, pot + C.REP_SALARY, 0)
+
+        # SyncAfterVote: the vote and / or the term limit
+        rounds_served = round_number - term_start + 1
+        term_is_up = rounds_served >= term_limit if term_limit else np.zeros(shape, dtype=bool)
+        removed = np.zeros(shape, dtype=bool)
+        stage2 = np.zeros(shape, dtype=bool)
+        if treatment['vote']:
+            votes = rng.binomial(C.NUM_VOTERS, replace_prob, shape)
+            if term_limit:
+                # no vote in the lame duck round
+                votes = np.where(term_is_up, 0, votes)
+            voted_out = rule(votes, C.NUM_VOTERS)
+            if treatment['chaos']:
+                voted_out ^= rng.random(shape) < C.OPPOSITE_OUTCOME_PROB
+            removed |= voted_out
+            # in Treatment 3 only a rep leaving on the term limit makes the Stage 2 decision
+            if not term_limit:
+                stage2 |= voted_out
+        if term_limit:
+            by_term = term_is_up & ~removed
+            removed |= by_term
+            stage2 |= by_term
+        removed &= active
+        stage2 &= active
+
+        # Stage2Decision: the leaving rep sets the multipliers for the next rep
+        decision = rng.choice(len(STAGE2_FACTORS), size=shape, p=stage2_probs)
+        payout -= np.where(stage2 & (decision != NEUTRAL), C.STAGE_2_COST, 0)
+        factor = STAGE2_FACTORS[decision]
+        voter_multiplier = np.where(stage2, C.BASE_VOTER_SUCCESS_PAYOFF * factor, voter_multiplier)
+        rep_multiplier = np.where(stage2, C.BASE_REP_SUCCESS_PAYOFF * factor, rep_multiplier)
+
+        # EndOfRoundWaitPage: random stop, then promotion of the next rep
+        if treatment['horizon'] and round_number >= C.INDEFINITE_HORIZON_START_ROUND:
+            active &= rng.random(shape) <= C.CONTINUATION_PROBABILITY
+        promoted = removed & active & (reps_left > 0)
+        reps_used += promoted
+        reps_left -= promoted
+        term_start = np.where(promoted, round_number + 1, term_start)
+        active &= ~(removed & ~promoted)
+
+    return rounds_played.max(axis=1), reps_used.sum(axis=1), payout.sum(axis=1)
+
+
+def run(app_name, num_sessions, chunk_size, seed, **behaviour):
+    """Simulates num_sessions sessions in chunks of chunk_size and concatenates the results."""
+    rng = np.random.default_rng(seed)
+    results = []
+    for start in range(0, num_sessions, chunk_size):
+        results.append(simulate(app_name, min(chunk_size, num_sessions - start), rng=rng, **behaviour))
+    return [np.concatenate(arrays) for arrays in zip(*results)]
+
+
+def describe(label, values):
+    p5, p50, p95 = np.percentile(values, [5, 50, 95])
+    print(f'  {label:<22} {values.mean():>10.1f} {p5:>10.1f} {p50:>10.1f} {p95:>10.1f} {values.max():>10.1f}')
+
+
+def report(app_name, num_rounds, rounds_played, reps_used, payout, participants, elapsed):
+    defaults = settings.SESSION_CONFIG_DEFAULTS
+    budget = payout * defaults['real_world_currency_per_point'] + participants * defaults['participation_fee']
+    print(f'{app_name}: {len(payout):,} sessions in {elapsed:.1f}s')
+    print(f"  {'':<22} {'mean':>10} {'p5':>10} {'median':>10} {'p95':>10} {'max':>10}")
+    describe('rounds played', rounds_played)
+    describe('reps used', reps_used)
+    describe('payout (points)', payout)
+    describe('budget (currency)', budget)
+    shares = np.bincount(rounds_played, minlength=num_rounds + 1)[1:] / len(rounds_played)
+    print('  P(rounds played = n):  ' + '  '.join(f'{n}: {share:.1%}' for n, share in enumerate(shares, start=1)))
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Forecast session length and payout of the rotation treatments.')
+    parser.add_argument('apps', nargs='*', metavar='app', help=f"default: all of {', '.join(TREATMENTS)}")
+    parser.add_argument('--sessions', type=int, default=1_000_000)
+    parser.add_argument('--chunk-size', type=int, default=250_000)
+    parser.add_argument('--participants', type=int, default=8, help='participants per session')
+    parser.add_argument('--num-cohorts', type=int, default=settings.SESSION_CONFIG_DEFAULTS.get('num_cohorts', 1))
+    parser.add_argument('--replace-prob', type=float, default=0.5, help='probability that a voter votes Replace')
+    parser.add_argument(
+        '--stage2', type=float, nargs=3, default=[1 / 3, 1 / 3, 1 / 3], metavar=('SABOTAGE', 'NEUTRAL', 'HELP'),
+        help='probabilities of the Stage 2 decisions',
+    )
+    parser.add_argument('--slider-mean', type=float, default=10, help='mean sliders solved per player and round')
+    parser.add_argument(
+        '--vote-rule', choices=list(vote_engine.RULES),
+        default=settings.SESSION_CONFIG_DEFAULTS.get('vote_rule', 'majority'),
+    )
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    for app_name in args.apps:
+        if app_name not in TREATMENTS:
+            parser.error(f'no forecast model for {app_name}, choose from {", ".join(TREATMENTS)}')
+    stage2_probs = np.array(args.stage2) / sum(args.stage2)
+    for app_name in args.apps or TREATMENTS:
+        start = time.perf_counter()
+        rounds_played, reps_used, payout = run(
+            app_name, args.sessions, args.chunk_size, args.seed,
+            participants=args.participants, num_cohorts=args.num_cohorts, replace_prob=args.replace_prob,
+            stage2_probs=stage2_probs, slider_mean=args.slider_mean, vote_rule=args.vote_rule,
+        )
+        num_rounds = importlib.import_module(app_name).C.NUM_ROUNDS
+        report(app_name, num_rounds, rounds_played, reps_used, payout, args.participants, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
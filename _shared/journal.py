@@ -0,0 +1,264 @@
+"""Input journal of a session, and a headless replay of it.
+
+Recording: attach(page_sequence) in an app makes every page of it append to the
+session's journal, journal/<session_code>.jsonl (session config 'journal_dir'):
+one JSON line per form submission, with the submitted fields and whether the page
+timed out, and one per live message, each with a timestamp. A live message also
+records how long before it the page's server clock fields were set (the slider task's
+slider_started_at and slider_shown_at), since the live method checks its answers
+against them. The first line records
+the session config, the number of participants and the random seed (see rng_engine).
+A submission also records a few of the player's fields as they were when the page was
+submitted (role, vote, game role, payoff), which the replay checks. Bots are never
+journaled. Off by default; set journal=True in a session config to turn it on (the debug configs do).
+
+Replay: from the project folder,
+
+    python -m _shared.journal journal/<session_code>.jsonl [--export DIR] [--timing]
+
+creates a new session of the same config with the recorded seed, in an in-memory
+database like `otree test`, and plays it with the apps' bots (see bots.py). They submit
+exactly the journaled forms and timeouts and send the journaled live messages, as fast
+as the server answers, each with the page's clock fields moved back to the journaled
+distance, so the live method accepts and rejects the same messages as in the lab. Each submission is checked against the recorded fields and the
+replay stops at the first difference. With --timing, the timing report of bot_timing.py
+then profiles the workload of the recorded session.
+"""
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+
+from otree.api import WaitPage
+
+from _shared import otree_internals
+
+DEFAULT_DIR = 'journal'
+
+# Player fields recorded with each submission and checked by the replay, where the app
+# has them, besides the payoff
+CHECKED_FIELDS = ['is_voter', 'is_active_rep', 'vote_choice', 'game_role']
+# Player fields holding server times that a live method compares its clock with (see
+# slider_engine). Journaled as the seconds between them and the live message.
+CLOCK_FIELDS = ['slider_started_at', 'slider_shown_at']
+
+# Set by the replay check (check_replay.py) to journal the bots like participants
+journal_bots = False
+
+
+def attach(page_sequence):
+    """Call once on an app's page_sequence: journals the submissions and live messages of its pages."""
+    for page in page_sequence:
+        if issubclass(page, WaitPage):
+            continue
+        page.before_next_page = staticmethod(_journaled_before_next_page(page, page.before_next_page))
+        if page.live_method:
+            page.live_method = staticmethod(_journaled_live_method(page, page.live_method))
+
+
+def _journaled_before_next_page(page, before_next_page):
+    def wrapper(player, timeout_happened=False):
+        replay = get_replay()
+        if replay:
+            replay.check(player, page, _checked_fields(player))
+        elif is_journaled(player):
+            fields = {f: player.field_maybe_none(f) for f in getattr(page, 'form_fields', None) or []}
+            write(player, page, submit=fields, timeout=bool(timeout_happened), state=_checked_fields(player))
+        return before_next_page(player, timeout_happened=timeout_happened)
+    return wrapper
+
+
+def _journaled_live_method(page, live_method):
+    def wrapper(player, data):
+        if is_journaled(player) and not get_replay():
+            write(player, page, live=data, clock=_clock_fields(player))
+        return live_method(player, data)
+    return wrapper
+
+
+def _checked_fields(player):
+    columns = type(player).__table__.columns.keys()
+    state = {f: player.field_maybe_none(f) for f in CHECKED_FIELDS if f in columns}
+    state['payoff'] = float(player.payoff)
+    return state
+
+
+def _clock_fields(player):
+    """Seconds since each clock field of the player that is set, by the server's clock."""
+    columns = type(player).__table__.columns.keys()
+    now = time.time()
+    values = {f: player.field_maybe_none(f) for f in CLOCK_FIELDS if f in columns}
+    return {f: now - value for f, value in values.items() if value is not None}
+
+
+def is_journaled(player):
+    return player.session.config.get('journal', False) and (journal_bots or not otree_internals.is_bot(player.participant))
+
+
+def get_path(session):
+    return os.path.join(session.config.get('journal_dir', DEFAULT_DIR), f'{session.code}.jsonl')
+
+
+def write(player, page, **entry):
+    """Appends one entry for player on page to the session's journal, creating it with its header."""
+    session = player.session
+    path = get_path(session)
+    lines = []
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        from _shared import rng_engine
+        lines.append(dict(
+            session=session.code, config=session.config['name'], participants=session.num_participants,
+            random_seed=rng_engine.get_seed(session), t=round(time.time(), 3),
+        ))
+    lines.append(dict(
+        t=round(time.time(), 3), p=player.participant.id_in_session, app=player.get_folder_name(),
+        r=player.round_number, page=page.__name__, **entry,
+    ))
+    with open(path, 'a') as f:
+        for line in lines:
+            f.write(json.dumps(line, separators=(',', ':')) + '\n')
+
+
+def read(path):
+    """The header and the entries of a journal."""
+    with open(path) as f:
+        header = json.loads(f.readline())
+        return header, [json.loads(line) for line in f]
+
+
+# --- Replay ---
+
+# The journal being replayed in this process, if any. Kept here rather than in the
+# session config, so the bots can look it up without loading the Session: a bot that
+# loads it holds a stale copy of session.vars, which a later commit in the bot's
+# database session (e.g. after a live method) writes back over the server's.
+_replay = None
+
+
+class Replay:
+    """The journal of a session being replayed, indexed for the bots and the checks."""
+
+    def __init__(self, path):
+        self.header, entries = read(path)
+        # (participant, app, round, page) -> submission entry
+        self.submits = {}
+        # (app, round, page) -> live entries, in the order they arrived
+        self.live = defaultdict(list)
+        for entry in entries:
+            key = (entry['app'], entry['r'], entry['page'])
+            if 'live' in entry:
+                self.live[key].append(entry)
+            else:
+                self.submits[(entry['p'],) + key] = entry
+        self.num_live = sum(len(v) for v in self.live.values())
+        self.replayed = set()
+
+    def get_submit(self, player, page):
+        """The journaled submission of page by player; the bots call it before submitting."""
+        key = (player.participant.id_in_session, player.get_folder_name(), player.round_number, page.__name__)
+        if key not in self.submits:
+            raise AssertionError(f'Replay diverged: the journal has no submission of {key}')
+        self.replayed.add(key)
+        return self.submits[key]
+
+    def check(self, player, page, state):
+        expected = self.get_submit(player, page)['state']
+        for field, value in expected.items():
+            if state.get(field) != value:
+                raise AssertionError(
+                    f'Replay diverged: participant {player.participant.id_in_session}, '
+                    f'{player.get_folder_name()} round {player.round_number} {page.__name__}: '
+                    f'{field} was {value!r}, replayed {state.get(field)!r}'
+                )
+
+    def play_live(self, page, group):
+        """Sends the group's journaled live messages on page, in their original order.
+        Before each one the player's clock fields are set back as far as they were when
+        the message arrived, as bots.play_sliders() does, or the live method would refuse
+        answers sent this fast."""
+        players = {p.participant.id_in_session: p for p in group.get_players()}
+        for entry in self.live[(group.get_folder_name(), group.round_number, page.__name__)]:
+            if entry['p'] in players:
+                player = players[entry['p']]
+                now = time.time()
+                for field, seconds in entry.get('clock', {}).items():
+                    setattr(player, field, now - seconds)
+                page.live_method(player, entry['live'])
+
+
+def start_replay(path):
+    """Makes the bots and the journaled pages of this process replay the journal at path."""
+    global _replay
+    _replay = Replay(path)
+    return _replay
+
+
+def get_replay():
+    """The Replay of the journal being replayed, or None outside a replay."""
+    return _replay
+
+
+def replay_session(path):
+    """Creates a session of the journaled config and seed, and plays the journal at path
+    on it with the bots. otree must be set up, with an in-memory database (see main()).
+    Returns the Replay and the seconds it took; raises AssertionError where the replay diverges."""
+    from otree.bots.runner import run_bots
+    from otree.session import create_session
+
+    header, _ = read(path)
+    start = time.perf_counter()
+    session = create_session(
+        header['config'], num_participants=header['participants'],
+        modified_session_config_fields=dict(random_seed=header['random_seed']),
+    )
+    replay = start_replay(path)
+    run_bots(session.id)
+    elapsed = time.perf_counter() - start
+
+    missing = set(replay.submits) - replay.replayed
+    if missing:
+        raise AssertionError(f'Replay diverged: {len(missing)} journaled submissions were never reached, e.g. {min(missing)}')
+    return replay, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a journaled session headlessly with the bots.')
+    parser.add_argument('path', help='journal file, e.g. journal/<session_code>.jsonl')
+    parser.add_argument('--export', metavar='DIR', help='also export the replayed data to DIR')
+    parser.add_argument('--timing', action='store_true', help="also time the server's requests (see bot_timing.py)")
+    args = parser.parse_args()
+
+    # Like `otree test`: the replay never touches the server's database
+    os.environ['OTREE_IN_MEMORY'] = '1'
+    from otree.main import setup
+    setup()
+    # This file runs as __main__, while the apps and bots use the _shared.journal module
+    from _shared import bot_timing
+    from _shared.journal import replay_session
+
+    header, _ = read(args.path)
+    # Session creation makes no page requests, so starting the timing first times the same
+    records = bot_timing.start() if args.timing else None
+    try:
+        replay, elapsed = replay_session(args.path)
+    except AssertionError as e:
+        raise SystemExit(str(e))
+    print(
+        f"Replayed session {header['session']} ({header['config']}, {header['participants']} participants): "
+        f'{len(replay.submits):,} submissions and {replay.num_live:,} live messages in {elapsed:.1f}s, all checks passed'
+    )
+    if records is not None:
+        bot_timing.report(records)
+    if args.export:
+        import otree.export
+        from otree import settings
+        os.makedirs(args.export, exist_ok=True)
+        for app in settings.OTREE_APPS:
+            with open(os.path.join(args.export, f'{app}.csv'), 'w', newline='', encoding='utf8') as f:
+                otree.export.export_app(app, f)
+
+
+if __name__ == '__main__':
+    main()
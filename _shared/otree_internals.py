@@ -0,0 +1,131 @@
+"""The oTree internals that the rotation engine, the bots, the bot timing, the journal
+and the session pool rely on, kept in this one module.
+
+oTree has no public API for these: which page a bot is on, what page an index in a
+participant's URL stands for, the database session and the models that rows are added
+to, queried and linked with, a second database session next to the bots' own, the app
+the bots' test client runs, the session-wide link, and the table that opens a session
+in a room. They are written against oTree 6.0.15, and oTree 5.11 has the same names.
+Importing this module checks that the attributes are still there and raises if an oTree
+upgrade removed them, so the upgrade fails here, once, rather than in every app's tests.
+"""
+import importlib
+
+import otree
+from otree.database import db
+from otree.lookup import get_page_lookup
+from otree.models import Participant, Session
+from otree.models_concrete import RoomToSession
+from sqlalchemy.orm import joinedload
+
+CHECKED_WITH = '6.0.15'
+
+_missing = [
+    name for name, present in [
+        ('Participant._session_code', hasattr(Participant, '_session_code')),
+        ('Participant._is_bot', hasattr(Participant, '_is_bot')),
+        ('Session._anonymous_code', hasattr(Session, '_anonymous_code')),
+        ('db._db', hasattr(type(db), '_db')),
+        ('db.new_session', hasattr(db, 'new_session')),
+    ]
+    if not present
+]
+if _missing:
+    raise ImportError(
+        f"oTree {otree.__version__} lacks {', '.join(_missing)}, which _shared/otree_internals.py "
+        f'was written for (oTree {CHECKED_WITH}); update that module for this version.'
+    )
+
+
+def page_at(session_code, page_index):
+    """The (app name, page class, round number) at page_index of the session's participants' page sequence."""
+    lookup = get_page_lookup(session_code, page_index)
+    return lookup.app_name, lookup.page_class, lookup.round_number
+
+
+def page_index_in_path(path):
+    """The page index in a participant page's URL path (/p/<code>/<app>/<Page>/<index>),
+    with the participant code, or None for any other path."""
+    parts = path.strip('/').split('/')
+    if len(parts) != 5 or parts[0] != 'p':
+        return None
+    return parts[1], int(parts[4])
+
+
+def bot_page(participant_bot):
+    """The (app name, page class, round number) of the page a bot's browser is on, or
+    None once the participant has left the app sequence."""
+    found = page_index_in_path(participant_bot.path)
+    if found is None:
+        return None
+    return page_at(participant_bot.session_code, found[1])
+
+
+def open_in_room(room_name, session):
+    """Opens session in the room, replacing the room's session. Writes the database row
+    the server looks the room's session up in on every visit, which is all
+    Room.set_session() does, so a running server sees it without a restart."""
+    RoomToSession.objects_filter(room_name=room_name).delete()
+    RoomToSession.objects_create(room_name=room_name, session=session)
+
+
+def session_code_of(participant_code):
+    """The session code of a participant, by a column query that leaves their vars unloaded."""
+    return db.query(Participant._session_code).filter(Participant.code == participant_code).scalar()
+
+
+def is_bot(participant):
+    return participant._is_bot
+
+
+def session_wide_link(session):
+    """The path of the session's session-wide link, which any number of participants can open."""
+    return f'/join/{session._anonymous_code}'
+
+
+def player_model(subsession):
+    """The Player model of the subsession's app."""
+    return importlib.import_module(subsession.get_folder_name()).Player
+
+
+def players_with_participants(subsession):
+    """The subsession's players in id order, each with its participant loaded by the same query."""
+    Player = player_model(subsession)
+    return list(subsession.player_set.options(joinedload(Player.participant)).order_by(Player.id))
+
+
+def query(*entities):
+    return db.query(*entities)
+
+
+def add_row(row):
+    db.add(row)
+
+
+def delete_row(row):
+    db.delete(row)
+
+
+def expire_all():
+    """Makes the database session reload every row on its next access, e.g. after
+    another database session has changed them."""
+    db.expire_all()
+
+
+def run_in_new_db_session(function, *args):
+    """Calls function(*args) in a database session of its own, then puts the caller's back."""
+    outer = db._db
+    db.new_session()
+    try:
+        return function(*args)
+    finally:
+        db.close()
+        db._db = outer
+
+
+def wrap_test_client_app(wrap):
+    """Replaces the ASGI app the bots' test client sends its requests to with wrap(app)."""
+    # Imported here, not with this module: the apps import this module, and otree.asgi
+    # imports the apps. The test client imports otree.asgi.app when the run starts.
+    import otree.asgi
+    otree.asgi.app = wrap(otree.asgi.app)
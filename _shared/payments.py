@@ -0,0 +1,94 @@
+"""Cross-app payoff ledger and the payment file.
+
+Every app adds each payoff it sets to the participant's ledger with record(), a dict in
+participant.vars['app_payoffs'] from app name to the participant's points in that app
+(the rotation treatments do it through rotation_engine.record_payoff()). So at the end
+of a session each participant's earnings, app by app, are on the participant row, and
+the payment file is written in one pass over the session's participants, without
+reading the player rows of any app.
+
+From the project folder:
+
+    python -m _shared.payments <session_code>                       # writes payments_<session_code>.csv
+    python -m _shared.payments <session_code> --output tuesday.csv
+    python -m _shared.payments <session_code> --output -             # to stdout
+
+One row per participant: label, code, the points of every app in the session's
+app_sequence, the total, the participation fee and the payment in real-world currency
+(points times real_world_currency_per_point, plus the fee; see SESSION_CONFIG_DEFAULTS).
+Uses the database of the server (DATABASE_URL, or db.sqlite3 for the devserver).
+"""
+import argparse
+import csv
+import sys
+
+
+def record(player, amount):
+    """Call wherever a player's payoff changes, with the change."""
+    app_payoffs = player.participant.vars.setdefault('app_payoffs', {})
+    app_name = player.get_folder_name()
+    app_payoffs[app_name] = app_payoffs.get(app_name, 0) + amount
+
+
+def header(session):
+    return (
+        ['participant_label', 'participant_code', 'id_in_session']
+        + session.config['app_sequence']
+        + ['total_points', 'participation_fee', 'payment']
+    )
+
+
+def payment_rows(session):
+    """Yields the header and one row per participant, in id_in_session order."""
+    from otree.api import cu
+    from otree.models import Participant
+    app_sequence = session.config['app_sequence']
+    participation_fee = session.config['participation_fee']
+    yield header(session)
+    participants = Participant.objects_filter(session=session).order_by(Participant.id_in_session)
+    for participant in participants:
+        app_payoffs = participant.vars.get('app_payoffs', {})
+        total = cu(sum(app_payoffs.values()))
+        yield (
+            [participant.label or '', participant.code, participant.id_in_session]
+            + [float(app_payoffs.get(app_name, 0)) for app_name in app_sequence]
+            + [float(total), float(participation_fee), float(total.to_real_world_currency(session) + participation_fee)]
+        )
+
+
+def write(session, f):
+    """Writes the payment file to the open file f. Returns the number of participants."""
+    writer = csv.writer(f)
+    rows = payment_rows(session)
+    writer.writerow(next(rows))
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a session's payment file from the participants' payoff ledgers.")
+    parser.add_argument('session_code')
+    parser.add_argument('--output', help="CSV file to write, '-' for stdout (default: payments_<session_code>.csv)")
+    args = parser.parse_args()
+
+    from otree.main import setup
+    setup()
+    from otree.models import Session
+
+    session = Session.objects_first(code=args.session_code)
+    if session is None:
+        parser.error(f'no session with code {args.session_code}')
+    output = args.output or f'payments_{args.session_code}.csv'
+    if output == '-':
+        write(session, sys.stdout)
+        return
+    with open(output, 'w', newline='') as f:
+        count = write(session, f)
+    print(f'{count} participants written to {output}')
+
+
+if __name__ == '__main__':
+    main()
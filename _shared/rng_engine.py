@@ -0,0 +1,54 @@
+from otree.api import *
+import random
+import secrets
+
+# Reproducible randomness. Every session has one seed, taken from the session config
+# ('random_seed') or drawn when the session is created, and recorded in
+# session.vars['random_seed']. All random draws of the apps come from named streams
+# derived from it: stream(obj, name, *keys) gives a random.Random seeded by the seed,
+# the app, the stream name and the keys (cohort index, round number, ...). A stream
+# never shares state with another stream, another session or the global `random`, so
+# draws don't depend on the order in which callbacks run or on other sessions in the
+# same process, and a session created with the recorded seed draws exactly the same
+# values again.
+#
+# Streams used by the apps:
+ROLES = 'roles'              # dealing participants into cohorts, voters and rep pools
+MATCHING = 'matching'        # random groups of the warm-up games, per round
+TERMINATION = 'termination'  # indefinite horizon, per cohort
+CHAOS = 'chaos'              # opposite vote outcome of Treatment 2b, per cohort and round
+SLIDERS = 'sliders'          # slider goals, per participant, round and slider
+
+
+def get_seed(session):
+    """The session's seed. Set on first use, from session config 'random_seed' if given."""
+    if 'random_seed' not in session.vars:
+        seed = session.config.get('random_seed')
+        session.vars['random_seed'] = secrets.randbits(32) if seed is None else seed
+    return session.vars['random_seed']
+
+
+def stream(obj, name, *keys):
+    """A random.Random for the stream `name` of obj's app (obj: subsession, group or player)."""
+    key = '-'.join(str(k) for k in (get_seed(obj.session), obj.get_folder_name(), name) + keys)
+    return random.Random(key)
+
+
+def group_randomly(subsession: BaseSubsession):
+    """Seeded replacement for subsession.group_randomly(): shuffles the players into
+    groups of the current sizes using the round's matching stream, and returns the new
+    group matrix (a list of each group's players). The groups oTree created for the round are kept and only the players are moved,
+    all in one flush, whereas set_group_matrix() deletes and recreates every group and
+    commits once per group, which dominated session creation."""
+    sizes = [len(row) for row in subsession.get_group_matrix()]
+    groups = subsession.get_groups()
+    players = subsession.get_players()
+    stream(subsession, MATCHING, subsession.round_number).shuffle(players)
+    group_matrix = []
+    for group, size in zip(groups, sizes):
+        row, players = players[:size], players[size:]
+        for id_in_group, player in enumerate(row, start=1):
+            player.group = group
+            player.id_in_group = id_in_group
+        group_matrix.append(row)
+    return group_matrix
@@ -0,0 +1,71 @@
+"""Per-round checkpoints of the rotation state.
+
+The rotation state of an app (its cohorts: voters, rep pool, current rep, removed and
+dropped participants, term start, legacy effect, multipliers, game over, ledger) lives in
+the cohorts' CohortStatus rows and the participants' CohortMember rows, and is changed in
+place by several callbacks each round. At every round boundary, once the round's groups
+are formed, the apps call save(), which writes the whole state as JSON into the round's
+Subsession.rotation_checkpoint field. So each round has its own version of the state,
+stored in the same database as the session and exported with the subsession's fields;
+loads() reads one back. The bots replay each participant's history through them (see
+bots.check_history()).
+
+There is no command to restore a checkpoint. Putting back the rotation state alone would
+leave the round's Group and Player rows, the payoffs and the participants' cross-app
+ledgers as the round had changed them, and oTree cannot move participants back to the
+start of a round to play it again. So a restore could only be done before the round had
+changed anything, when there is nothing to undo.
+"""
+import json
+import time
+
+from otree.api import cu
+
+from _shared import rotation_engine
+from _shared.rotation_engine import LIST_FIELDS, STATUS_FIELDS
+
+FORMAT_VERSION = 1
+
+
+def dumps(cohorts, members, round_number):
+    """Serializes one app's rotation state: its cohorts (RotationState, see
+    rotation_engine.get_cohorts()) and its members (CohortMember rows)."""
+    ledgers = [{} for _ in cohorts]
+    for m in members:
+        ledgers[m.cohort][m.participant_id] = m.payoff
+    return json.dumps(dict(
+        version=FORMAT_VERSION,
+        round_number=round_number,
+        saved_at=round(time.time()),
+        cohorts=[dict(cohort.to_dict(), payoff_ledger=ledger) for cohort, ledger in zip(cohorts, ledgers)],
+        cohort_of={m.participant_id: m.cohort for m in members},
+    ), default=float)  # payoffs are Currency
+
+
+def loads(text):
+    """The state saved by dumps(): a list of each cohort's fields (a dict, in cohort
+    order, with its payoff_ledger) and a dict from participant id to cohort. JSON object
+    keys are strings, so the participant ids in cohort_of and the payoff ledgers are
+    turned back into ints, and the payoffs back into Currency."""
+    checkpoint = json.loads(text)
+    if checkpoint['version'] != FORMAT_VERSION:
+        raise ValueError(f"Checkpoint format {checkpoint['version']} is not supported (expected {FORMAT_VERSION}).")
+    cohorts = []
+    for state in checkpoint['cohorts']:
+        # Checkpoints saved before the multipliers were kept on the status lack them
+        cohort = {name: state.get(name) for name in STATUS_FIELDS}
+        cohort.update({name: state[name] for name in LIST_FIELDS})
+        cohort['total_voter_points'] = cu(state['total_voter_points'])
+        cohort['total_rep_points'] = cu(state['total_rep_points'])
+        cohort['payoff_ledger'] = {int(pid): cu(amount) for pid, amount in state['payoff_ledger'].items()}
+        cohorts.append(cohort)
+    cohort_of = {int(pid): index for pid, index in checkpoint['cohort_of'].items()}
+    return cohorts, cohort_of
+
+
+def save(subsession):
+    """Call at a round boundary: stores the app's current state on subsession."""
+    cohorts = rotation_engine.get_cohorts(subsession)
+    members = list(rotation_engine.get_members(subsession.session, subsession.get_folder_name()))
+    subsession.rotation_checkpoint = dumps(cohorts, members, subsession.round_number)
+
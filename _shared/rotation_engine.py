@@ -1,58 +1,605 @@
 from otree.api import *
-import random
+from collections import deque
+from functools import cached_property
+
+from _shared import dropout_engine, otree_internals, payments, rng_engine
 
 # The PlayerWithRotation class has been REMOVED.
 
-def setup_rotation(subsession: BaseSubsession):
-    """This is the main engine function. It sets up and executes the rotation."""
-    session = subsession.session
-    
-    # DEFINITIVE FIX: Use subsession.constants to get the C class
-    C = subsession.constants
+# Rotation state is kept in typed rows per app, so that the treatment apps of one
+# session (e.g. Full_Experiment) never overwrite each other. Each app deals its
+# participants into cohorts. A cohort is an independent polity with its own voters, rep
+# pool, current rep, removed list and legacy effect, all on the cohort's CohortStatus
+# row; each participant's cohort and running payoff in the app are on their
+# CohortMember row. Players and groups carry a `cohort` field with the index of the
+# cohort they belong to.
+# None of it is in session.vars. session.vars is a single pickled column that is marked
+# as changed whenever it is read, so whoever had loaded the Session (a bot, a replay, a
+# live method in another database session) could write an older copy of the whole state
+# back. A row's columns are only written when they are set, and only those columns.
+# The participant lists are stored as comma-separated ids. RotationState parses each one
+# into a list, a set index or a deque the first time it is used, once per fetch of the
+# cohort (get_cohort(), get_cohorts()), and each change writes back only the lists it
+# touched. Pages and callbacks that only need the scalar fields read get_status(), which
+# parses nothing; so does record_payoff(), which reads the role off the player.
+#
+# Wait pages whose callback only reads and writes one active group (payoffs, the vote,
+# the term limit check) are group-level, so the other cohorts never hold them up.
+# Inactive players share one bench group per round (group 1) and skip these pages (on_bench()),
+# so they don't hold each other up either. Only regrouping (InitializeRoundWaitPage) and the
+# end-of-round promotion, plus the final results wait for the whole session. The promotion
+# decides whether a cohort's game is over, and so whether its members, bench included,
+# see the final results next; it holds nobody up for longer than the next round's
+# InitializeRoundWaitPage would anyway.
+#
+# Participants who dropped out (see dropout_engine) are taken out of their cohort by
+# substitute_dropouts() at the start of each round, before the roles are assigned, so
+# the active groups stop waiting out their timers. Each substitution is logged in the
+# subsession's `substitutions` field.
+#
+# The productivity multipliers a departing rep's Stage 2 decision sets are kept on the
+# cohort's status as well as on the rep's group (keep_multipliers()), and every new
+# active group starts from them (carry_over_multipliers()), so the next round never
+# has to look up the previous round's groups.
+#
+# Once a cohort's game is over, its members see the final results once, in the round it
+# ended (or the app's last round), and none of the app's pages after that. If another app
+# follows, TotalResults sends them straight on to it (app_after_this_page). Otherwise
+# finish_games() marks their players of the later rounds as game_ended, and
+# skip_finished_rounds() makes every page of those rounds skip itself for them by reading
+# that field, so the pages of a cohort still playing cost no extra query.
+#
+# Term limits (Treatments 1 and 3): a rep serves at most the app's C.TERM_LIMIT rounds
+# in a row. The cohort's status records the round the current rep took office, set when
+# the rep is promoted, so the rounds served, the rounds left and whether this is the
+# rep's last (lame duck) round are plain arithmetic (rounds_served(), rounds_left(),
+# is_lame_duck(), given the term limit), never a walk back through in_round().
 
-    # --- ONE-TIME SETUP (ROUND 1 ONLY) ---
-    if subsession.round_number == 1:
-        participants = session.get_participants()
-        random.shuffle(participants)
-        
-        voter_participants = participants[:C.NUM_VOTERS]
-        # ... rest of the function is the same
-        rep_pool_participants = participants[C.NUM_VOTERS:]
-        session.vars['voter_pids'] = [p.id for p in voter_participants]
-        session.vars['rep_pool_pids'] = [p.id for p in rep_pool_participants]
-        session.vars['removed_pids'] = []
-        if session.vars['rep_pool_pids']:
-            session.vars['current_rep_pid'] = session.vars['rep_pool_pids'].pop(0)
+
+class CohortStatus(ExtraModel):
+    """The state of one cohort of one app (see above)."""
+    session = models.Link(otree_internals.Session)
+    app = models.StringField()
+    cohort = models.IntegerField()
+    current_rep_pid = models.IntegerField()
+    rep_term_start_round = models.IntegerField(initial=1)
+    legacy_effect = models.StringField(initial='None')
+    game_over = models.BooleanField(initial=False)
+    # Round after which the indefinite horizon stops this cohort's game, drawn at
+    # session creation (None: the game runs until the pool or the rounds run out)
+    termination_round = models.IntegerField()
+    # Multipliers of the cohort's active group, as last set by a Stage 2 decision
+    # (None: the app's base multipliers)
+    voter_multiplier = models.FloatField()
+    rep_multiplier = models.FloatField()
+    # Participant ids, comma-separated: the permanent voters and the rep pool in order,
+    # the removed reps, and the dropped-out voters and pool members
+    voter_pids = models.LongStringField(initial='')
+    rep_pool = models.LongStringField(initial='')
+    removed_pids = models.LongStringField(initial='')
+    dropped_pids = models.LongStringField(initial='')
+    total_voter_points = models.CurrencyField(initial=0)
+    total_rep_points = models.CurrencyField(initial=0)
+    # Round whose final results closed the cohort's game (None while it runs, see finish_games())
+    end_round = models.IntegerField()
+
+    @property
+    def is_over(self):
+        """The cohort's game has ended: stopped by the horizon, or no rep left."""
+        return self.game_over or self.current_rep_pid is None
+
+    def rounds_served(self, round_number):
+        """Rounds the current rep has been in office, round_number included."""
+        return round_number - self.rep_term_start_round + 1
+
+    def rounds_left(self, round_number, term_limit):
+        """Rounds of the current rep's term after round_number."""
+        return max(term_limit - self.rounds_served(round_number), 0)
+
+    def is_lame_duck(self, round_number, term_limit):
+        """round_number is the last round of the current rep's term."""
+        return self.rounds_served(round_number) >= term_limit
+
+
+class CohortMember(ExtraModel):
+    """A participant's cohort in one app, and their running payoff total there, kept up
+    to date as payoffs are set so the final page never has to walk in_all_rounds()."""
+    session = models.Link(otree_internals.Session)
+    app = models.StringField()
+    participant = models.Link(otree_internals.Participant)
+    cohort = models.IntegerField()
+    payoff = models.CurrencyField(initial=0)
+
+
+STATUS_FIELDS = [
+    'current_rep_pid', 'rep_term_start_round', 'legacy_effect', 'game_over', 'termination_round',
+    'voter_multiplier', 'rep_multiplier', 'end_round',
+]
+# The fields of the status that RotationState holds as lists
+LIST_FIELDS = ['voter_pids', 'rep_pool', 'removed_pids', 'dropped_pids']
+TOTAL_FIELDS = ['total_voter_points', 'total_rep_points']
+
+
+def parse_pids(text):
+    return [int(pid) for pid in text.split(',')] if text else []
+
+
+def join_pids(pids):
+    return ','.join(str(pid) for pid in pids)
+
+
+def _status_field(name):
+    return property(
+        lambda self: getattr(self._status, name),
+        lambda self, value: setattr(self._status, name, value),
+    )
+
+
+class RotationState:
+    """The rotation state of one cohort, read from and written to its CohortStatus row.
+
+    Membership checks go through set indexes and the rep pool is a deque, so the
+    per-player checks on every page and the promotion of the next rep are O(1).
+    Each list and index is built from the row's id list the first time it is used,
+    so a check of the voters never parses the pool, and every change stores the
+    lists it touched back on the row.
+    """
+
+    current_rep_pid = _status_field('current_rep_pid')
+    rep_term_start_round = _status_field('rep_term_start_round')
+    legacy_effect = _status_field('legacy_effect')
+    game_over = _status_field('game_over')
+    termination_round = _status_field('termination_round')
+    voter_multiplier = _status_field('voter_multiplier')
+    rep_multiplier = _status_field('rep_multiplier')
+    total_voter_points = _status_field('total_voter_points')
+    total_rep_points = _status_field('total_rep_points')
+    end_round = _status_field('end_round')
+
+    def __init__(self, status):
+        self._status = status
+
+    @cached_property
+    def voter_pids(self):
+        return parse_pids(self._status.voter_pids)
+
+    @cached_property
+    def rep_pool(self):
+        return deque(parse_pids(self._status.rep_pool))
+
+    @cached_property
+    def removed_pids(self):
+        return parse_pids(self._status.removed_pids)
+
+    @cached_property
+    def dropped_pids(self):
+        """Dropped-out voters and pool members, who no longer take part."""
+        return parse_pids(self._status.dropped_pids)
+
+    @cached_property
+    def _voter_set(self):
+        return set(self.voter_pids)
+
+    @cached_property
+    def _pool_set(self):
+        return set(self.rep_pool)
+
+    @cached_property
+    def _removed_set(self):
+        return set(self.removed_pids)
+
+    def _store(self, *names):
+        for name in names:
+            setattr(self._status, name, join_pids(getattr(self, name)))
+
+    def to_dict(self):
+        """The cohort's state as plain values (see rotation_checkpoint)."""
+        state = {name: getattr(self._status, name) for name in STATUS_FIELDS + TOTAL_FIELDS}
+        state.update({name: list(getattr(self, name)) for name in LIST_FIELDS})
+        return state
+
+    def is_voter(self, pid):
+        return pid in self._voter_set
+
+    def in_pool(self, pid):
+        return pid in self._pool_set
+
+    def is_removed(self, pid):
+        return pid in self._removed_set
+
+    def is_active(self, pid):
+        """Voters and the current rep are active; everyone else is in the pool or removed."""
+        return pid in self._voter_set or pid == self.current_rep_pid
+
+    @property
+    def is_over(self):
+        return self._status.is_over
+
+    def rounds_served(self, round_number):
+        return self._status.rounds_served(round_number)
+
+    def rounds_left(self, round_number, term_limit):
+        return self._status.rounds_left(round_number, term_limit)
+
+    def is_lame_duck(self, round_number, term_limit):
+        return self._status.is_lame_duck(round_number, term_limit)
+
+    @property
+    def rep_pool_pids(self):
+        return list(self.rep_pool)
+
+    @property
+    def next_rep_pid(self):
+        return self.rep_pool[0] if self.rep_pool else None
+
+    def remove_rep(self, rep_pid):
+        if rep_pid not in self._removed_set:
+            self.removed_pids.append(rep_pid)
+            self._removed_set.add(rep_pid)
+            self._store('removed_pids')
+
+    def leave_pool(self, pid):
+        """Takes a dropped-out pool member out of the pool, so they are never promoted."""
+        self.rep_pool.remove(pid)
+        self._pool_set.discard(pid)
+        self.dropped_pids.append(pid)
+        self._store('rep_pool', 'dropped_pids')
+
+    def substitute_voter(self, pid):
+        """Gives a dropped-out voter's seat to the head of the pool. Returns the new voter,
+        or None if the pool is empty, in which case the voter keeps the seat."""
+        if not self.rep_pool:
+            return None
+        replacement = self.rep_pool.popleft()
+        self._pool_set.discard(replacement)
+        self.voter_pids[self.voter_pids.index(pid)] = replacement
+        self._voter_set.discard(pid)
+        self._voter_set.add(replacement)
+        self.dropped_pids.append(pid)
+        self._store('voter_pids', 'rep_pool', 'dropped_pids')
+        return replacement
+
+    def promote_next_rep(self, next_round):
+        """Moves the head of the pool into office for next_round, or leaves the cohort without a rep if the pool is empty."""
+        if self.rep_pool:
+            self.current_rep_pid = self.rep_pool.popleft()
+            self._pool_set.discard(self.current_rep_pid)
+            self.rep_term_start_round = next_round
+            self._store('rep_pool')
         else:
-            session.vars['current_rep_pid'] = None
-    voter_pids = session.vars['voter_pids']
-    current_rep_pid = session.vars.get('current_rep_pid')
+            self.current_rep_pid = None
+
+
+def get_num_cohorts(session):
+    """Number of cohorts the session is split into (session config 'num_cohorts', default 1)."""
+    return session.config.get('num_cohorts', 1)
+
+
+def get_status(obj):
+    """The CohortStatus of a player or group. Parses none of the id lists, so use it
+    wherever only the scalar state is needed."""
+    return CohortStatus.objects_get(session_id=obj.session_id, app=obj.get_folder_name(), cohort=obj.cohort)
+
+
+def get_statuses(subsession: BaseSubsession):
+    """The CohortStatus of every cohort of the app, in cohort order."""
+    query = CohortStatus.objects_filter(session_id=subsession.session_id, app=subsession.get_folder_name())
+    return list(query.order_by(CohortStatus.cohort))
+
+
+def get_cohorts(subsession: BaseSubsession):
+    return [RotationState(status) for status in get_statuses(subsession)]
+
+
+def get_cohort(obj):
+    """The cohort state of a player or group."""
+    return RotationState(get_status(obj))
+
+
+def get_members(session, app_name):
+    """The CohortMember of every participant of the app."""
+    return CohortMember.objects_filter(session_id=session.id, app=app_name)
+
+
+def get_ledger(subsession: BaseSubsession):
+    """Every participant's running payoff total in the app, by participant id, in one query."""
+    return {m.participant_id: m.payoff for m in get_members(subsession.session, subsession.get_folder_name())}
+
+
+def get_players(subsession: BaseSubsession):
+    """subsession.get_players() with every player's participant loaded by the same query.
+    Use it in callbacks that loop over the players and read p.participant, which would
+    otherwise load the participants one query at a time."""
+    return otree_internals.players_with_participants(subsession)
+
+
+def record_payoff(player: BasePlayer, amount, status=None):
+    """Call wherever a player's payoff changes, with the change, to keep the cohort's ledger
+    and the participant's cross-app ledger (see payments.py) current: adds amount to the
+    participant's running total and to the cohort's voter or rep aggregate. A callback
+    that records several payoffs of one cohort passes its status (get_status()), so it
+    is fetched once."""
+    payments.record(player, amount)
+    if status is None:
+        status = get_status(player)
+    member = CohortMember.objects_get(session_id=player.session_id, app=player.get_folder_name(), participant_id=player.participant_id)
+    member.payoff += amount
+    if player.is_voter:
+        status.total_voter_points += amount
+    else:
+        status.total_rep_points += amount
+
+
+def create_cohorts(subsession: BaseSubsession, num_voters):
+    """Round 1 only. Shuffles the participants and deals them into cohorts.
+    The first num_voters members of each cohort are its permanent voters,
+    the rest form its rep pool."""
+    session = subsession.session
+    app_name = subsession.get_folder_name()
+    num_cohorts = get_num_cohorts(session)
+    participants = session.get_participants()
+    if len(participants) < num_cohorts * (num_voters + 1):
+        raise ValueError(
+            f'{num_cohorts} cohorts need at least {num_cohorts * (num_voters + 1)} participants '
+            f'({num_voters} voters and 1 representative each), got {len(participants)}.'
+        )
+    rng_engine.stream(subsession, rng_engine.ROLES).shuffle(participants)
+
+    for index in range(num_cohorts):
+        members = participants[index::num_cohorts]
+        for p in members:
+            CohortMember.create(session=session, app=app_name, participant=p, cohort=index)
+        cohort = RotationState(CohortStatus.create(
+            session=session,
+            app=app_name,
+            cohort=index,
+            voter_pids=join_pids(p.id for p in members[:num_voters]),
+            rep_pool=join_pids(p.id for p in members[num_voters:]),
+        ))
+        cohort.promote_next_rep(1)
+
+
+def schedule_terminations(subsession: BaseSubsession, start_round, continuation_probability, num_rounds):
+    """Round 1 only, after create_cohorts. Draws each cohort's termination round up front:
+    from start_round on, each round ends the game with probability 1 - continuation_probability.
+    This is the same draw EndOfRoundWaitPage used to make every round, just done once,
+    from each cohort's own termination stream."""
+    for index, cohort in enumerate(get_cohorts(subsession)):
+        rng = rng_engine.stream(subsession, rng_engine.TERMINATION, index)
+        cohort.termination_round = None
+        for round_number in range(start_round, num_rounds + 1):
+            if rng.random() > continuation_probability:
+                cohort.termination_round = round_number
+                break
+
+
+def assign_cohorts(subsession: BaseSubsession):
+    """Copies every participant's cohort index onto their player in this round."""
+    cohort_of = {m.participant_id: m.cohort for m in get_members(subsession.session, subsession.get_folder_name())}
     for p in subsession.get_players():
+        p.cohort = cohort_of[p.participant_id]
+
+
+def assign_roles(subsession: BaseSubsession):
+    """Per-round role assignment and grouping.
+    Each cohort gets one active group (its current rep first, then its voters);
+    every inactive player (in the pool or removed) sits in the round's bench group. A
+    cohort whose game is over has no active group: all its members sit on the bench,
+    neither voter nor rep.
+    One bench instead of a solo group per inactive player keeps the number of Group
+    rows per round at about the number of cohorts.
+    The bench is group 1, where oTree puts every player when it creates the round, and
+    cohort i's active group is always group i + 2 (empty once the cohort has no active
+    group), so no player's group depends on what the other cohorts do. The active
+    groups' ids are recorded on the subsession so they can be fetched without a scan.
+    Only the roles, groups and positions that differ from what the rows already hold
+    are written: a new round's players start out inactive on the bench, so in the usual
+    round only the active players are written."""
+    cohorts = get_cohorts(subsession)
+    active_players = [[] for _ in cohorts]
+    inactive_players = []
+    players = get_players(subsession)
+    for p in players:
+        cohort = cohorts[p.cohort]
         pid = p.participant.id
-        if pid in voter_pids:
-            p.is_voter = True
-            p.is_active_rep = False
-        elif pid == current_rep_pid:
-            p.is_voter = False
-            p.is_active_rep = True
+        if cohort.is_over:
+            is_voter = is_active_rep = False
+        else:
+            is_voter = cohort.is_voter(pid)
+            is_active_rep = not is_voter and pid == cohort.current_rep_pid
+        if p.is_voter != is_voter:
+            p.is_voter = is_voter
+        if p.is_active_rep != is_active_rep:
+            p.is_active_rep = is_active_rep
+        if is_voter:
+            active_players[p.cohort].append(p)
+        elif is_active_rep:
+            active_players[p.cohort].insert(0, p)
         else:
-            p.is_voter = False
-            p.is_active_rep = False
-    active_players = [p for p in subsession.get_players() if p.is_voter or p.is_active_rep]
-    inactive_players = [p for p in subsession.get_players() if not (p.is_voter or p.is_active_rep)]
-    group_matrix = []
-    if active_players: group_matrix.append(active_players)
-    for p in inactive_players: group_matrix.append([p])
-    subsession.set_group_matrix(group_matrix)
+            inactive_players.append(p)
+    regroup(subsession, inactive_players, active_players)
+    subsession.active_group_ids = ','.join(
+        str(index + 2) if cohort_players else '' for index, cohort_players in enumerate(active_players)
+    )
 
 
-def T2a_EndOfRound(subsession: BaseSubsession):
-    # ... (this function is exactly the same as before)
+def regroup(subsession: BaseSubsession, bench, group_matrix):
+    """Replacement for subsession.set_group_matrix(). The bench players go to group 1,
+    with their id_in_subsession as id_in_group, which is where oTree put them when it
+    created the round; the rows of group_matrix (lists of players, possibly empty) are
+    groups 2, 3, and so on.
+    set_group_matrix() (which group_like_round() also goes through) deletes every group
+    of the round and creates each one again with its own query. This keeps the round's
+    groups, adds the missing ones in one flush, deletes any left over, and only writes
+    the players whose group or id_in_group changes. A group whose players all belong to
+    one cohort gets that cohort; the bench, and an empty group, get None."""
+    groups = subsession.get_groups()
+    Group = type(groups[0])
+    for id_in_subsession in range(len(groups) + 1, len(group_matrix) + 2):
+        group = Group(
+            session=subsession.session,
+            subsession=subsession,
+            round_number=subsession.round_number,
+            id_in_subsession=id_in_subsession,
+        )
+        otree_internals.add_row(group)
+        groups.append(group)
+    placements = [[(p.id_in_subsession, p) for p in bench]]
+    placements += [list(enumerate(row, start=1)) for row in group_matrix]
+    for index, (group, placement) in enumerate(zip(groups, placements)):
+        for id_in_group, p in placement:
+            if p.group is not group:
+                p.group = group
+            if p.id_in_group != id_in_group:
+                p.id_in_group = id_in_group
+        cohorts = {p.cohort for _, p in placement}
+        cohort = cohorts.pop() if index > 0 and len(cohorts) == 1 else None
+        if group.field_maybe_none('cohort') != cohort:
+            group.cohort = cohort
+    for group in groups[len(placements):]:
+        otree_internals.delete_row(group)
+
+
+def get_active_group(subsession: BaseSubsession, cohort_index):
+    """The active group of one cohort, or None if the cohort has no active group this round."""
+    group_id = subsession.active_group_ids.split(',')[cohort_index]
+    if not group_id:
+        return None
+    return subsession.group_set.filter_by(id_in_subsession=int(group_id)).one()
+
+
+def active_groups(subsession: BaseSubsession):
+    """The active group of every cohort that has one, in cohort order."""
+    groups = [get_active_group(subsession, index) for index in range(len(get_cohorts(subsession)))]
+    return [g for g in groups if g is not None]
+
+
+def on_bench(player: BasePlayer):
+    """True for an inactive player, who sits in the round's bench group (see assign_roles).
+    Group-level wait pages are not displayed to them: the bench has nothing to wait for."""
+    return not (player.is_voter or player.is_active_rep)
+
+
+def keep_multipliers(group: BaseGroup):
+    """Stage 2, after the rep's decision set the group's multipliers: keeps them on the
+    cohort's status for the cohort's next active groups."""
+    status = get_status(group)
+    status.voter_multiplier = group.voter_multiplier
+    status.rep_multiplier = group.rep_multiplier
+
+
+def carry_over_multipliers(subsession: BaseSubsession):
+    """InitializeRoundWaitPage, after assign_roles: every active group starts with the
+    multipliers its cohort's last Stage 2 decision set, if there was one."""
+    statuses = get_statuses(subsession)
+    for group in active_groups(subsession):
+        status = statuses[group.cohort]
+        if status.voter_multiplier is not None:
+            group.voter_multiplier = status.voter_multiplier
+            group.rep_multiplier = status.rep_multiplier
+
+
+def get_rep(group: BaseGroup):
+    """The active rep of an active group (always its first player), or None."""
+    player = group.get_player_by_id(1)
+    return player if player.is_active_rep else None
+
+
+def get_voters(group: BaseGroup):
+    return [p for p in group.get_players() if p.is_voter]
+
+
+def has_next_app(player: BasePlayer):
+    """Another app follows this one in the session's app_sequence."""
+    return player.session.config['app_sequence'][-1] != player.get_folder_name()
+
+
+def shows_final_results(player: BasePlayer, num_rounds):
+    """is_displayed of FinalWaitPage and TotalResults: the player's cohort's game ended in
+    this round, or this is the app's last round."""
+    status = get_status(player)
+    if status.end_round is not None:
+        return status.end_round == player.round_number
+    return status.is_over or player.round_number == num_rounds
+
+
+def finish_games(subsession: BaseSubsession, num_rounds):
+    """FinalWaitPage. Records this round as the end round of every cohort whose game is
+    over, or of every cohort if this is the app's last round, and sets game_ended on
+    their members' players of the later rounds, all in one UPDATE."""
+    finished = []
+    for status in get_statuses(subsession):
+        if status.end_round is None and (status.is_over or subsession.round_number == num_rounds):
+            status.end_round = subsession.round_number
+            finished.append(status.cohort)
+    if not finished or subsession.round_number == num_rounds:
+        return
+    members = get_members(subsession.session, subsession.get_folder_name())
+    pids = [m.participant_id for m in members if m.cohort in finished]
+    Player = otree_internals.player_model(subsession)
+    otree_internals.query(Player).filter(
+        Player.session_id == subsession.session_id,
+        Player.round_number > subsession.round_number,
+        Player.participant_id.in_(pids),
+    ).update({Player.game_ended: True}, synchronize_session=False)
+
+
+def skip_finished_rounds(page_sequence):
+    """Call once on a treatment app's page_sequence: every page skips itself for players
+    whose cohort's game ended in an earlier round (game_ended, see finish_games())."""
+    for page in page_sequence:
+        page.is_displayed = staticmethod(_unless_game_ended(page.is_displayed))
+
+
+def _unless_game_ended(is_displayed):
+    def wrapper(player):
+        return not player.game_ended and is_displayed(player)
+    return wrapper
+
+
+def substitute_dropouts(subsession: BaseSubsession):
+    """InitializeRoundWaitPage, before assign_roles. Takes every participant who dropped out
+    out of their cohort: pool members leave the pool, a dropped rep is removed and the next
+    rep promoted as on EndOfRoundWaitPage, and a dropped voter's seat goes to the head of
+    the pool. The rep is replaced before the voters, since a cohort without a rep is over.
+    Logs each change in subsession.substitutions as cohort:role:dropped_pid:replacement_pid,
+    separated by ';' (no replacement_pid if the pool was empty)."""
     session = subsession.session
-    removed_rep = next((p for p in subsession.get_players() if p.was_removed_this_round), None)
-    if removed_rep:
-        session.vars['removed_pids'].append(removed_rep.participant.id)
-        if session.vars['rep_pool_pids']:
-            session.vars['current_rep_pid'] = session.vars['rep_pool_pids'].pop(0)
-        else:
-            session.vars['current_rep_pid'] = None
\ No newline at end of file
+    dropped = {
+        p.participant.id for p in get_players(subsession)
+        if dropout_engine.is_dropped(p.participant, session)
+    }
+    entries = []
+    for index, cohort in enumerate(get_cohorts(subsession)):
+        if cohort.is_over:
+            continue
+        for pid in [pid for pid in cohort.rep_pool if pid in dropped]:
+            cohort.leave_pool(pid)
+            entries.append(f'{index}:pool:{pid}:')
+        rep_pid = cohort.current_rep_pid
+        if rep_pid in dropped:
+            cohort.remove_rep(rep_pid)
+            cohort.promote_next_rep(subsession.round_number)
+            entries.append(f"{index}:rep:{rep_pid}:{cohort.current_rep_pid or ''}")
+        for pid in [pid for pid in cohort.voter_pids if pid in dropped]:
+            replacement = cohort.substitute_voter(pid)
+            if replacement:
+                entries.append(f'{index}:voter:{pid}:{replacement}')
+    subsession.substitutions = ';'.join(entries)
+
+
+def setup_rotation(subsession: BaseSubsession, num_voters):
+    """This is the main engine function. It sets up and executes the rotation."""
+    # --- ONE-TIME SETUP (ROUND 1 ONLY) ---
+    if subsession.round_number == 1:
+        create_cohorts(subsession, num_voters)
+    assign_cohorts(subsession)
+    assign_roles(subsession)
+
+
+def T2a_EndOfRound(subsession: BaseSubsession):
+    for group in active_groups(subsession):
+        if group.rep_was_removed_this_round:
+            cohort = get_cohort(group)
+            cohort.remove_rep(cohort.current_rep_pid)
+            cohort.promote_next_rep(subsession.round_number + 1)
@@ -0,0 +1,145 @@
+from otree.api import *
+
+from _shared import rotation_engine
+
+# Long-format export of the rotation treatments: one row per player and round with
+# the player's role, tenure, vote, the round's outcome and the multipliers in effect.
+# Each app's custom_export passes its players straight through export_rows().
+#
+# The rows are produced in a single pass in the order oTree hands the players over
+# (by id, so session by session and round by round). Only the state of the current
+# session is kept: who has served as rep, who dropped out, each participant's current
+# role streak and each cohort's multipliers from the previous round, plus the round each
+# cohort's game ended in, read once per session. Everything else comes from the player,
+# participant, group, subsession and session rows oTree already joined into its query,
+# so no query is made per row.
+#
+# A cohort's rounds after the one its game ended in were never played, so they have no
+# rows: players with game_ended set, or past their cohort's end_round, are skipped.
+#
+# Roles: 'rep', 'voter', 'pool', 'removed' (a former rep) and 'dropped' (a voter or pool
+# member taken out of the cohort as a dropout, see rotation_engine.substitute_dropouts).
+# A rep removed as a dropout is 'removed', with removal_reason 'dropout' on their row of
+# the round they were taken out, as that round's substitutions record.
+
+HEADER = [
+    'session_code', 'participant_code', 'id_in_session', 'round_number', 'cohort',
+    'role', 'tenure', 'vote', 'replace_votes', 'rep_removed', 'removal_reason',
+    'stage2_decision', 'voter_multiplier', 'rep_multiplier', 'slider_score', 'payoff', 'auto_filled',
+]
+
+STAGE2_LABELS = {1: 'Sabotage', 0: 'Neutral', 2: 'Help'}
+
+
+class _SessionState:
+    """Running state of the session currently being exported."""
+
+    def __init__(self, subsession):
+        self.session_id = subsession.session_id
+        # cohort -> round its game ended in, None while it runs (see rotation_engine.finish_games)
+        self.end_rounds = {s.cohort: s.end_round for s in rotation_engine.get_statuses(subsession)}
+        self.round_number = 0
+        self.served_as_rep = set()
+        self.dropped = set()
+        # Reps taken out as dropouts at the start of the current round
+        self.dropped_reps = set()
+        # participant id -> (role, consecutive rounds in that role)
+        self.streaks = {}
+        # cohort -> (voter_multiplier, rep_multiplier) at the end of the previous / current round
+        self.previous_multipliers = {}
+        self.current_multipliers = {}
+
+    def start_round(self, subsession):
+        if subsession.round_number != self.round_number:
+            self.previous_multipliers = self.current_multipliers
+            self.current_multipliers = {}
+            self.round_number = subsession.round_number
+            self.dropped_reps = set()
+            # cohort:role:dropped_pid:replacement_pid entries, separated by ';'
+            for entry in filter(None, subsession.substitutions.split(';')):
+                _, role, pid, _ = entry.split(':')
+                (self.dropped_reps if role == 'rep' else self.dropped).add(int(pid))
+
+    def update_streak(self, pid, role):
+        last_role, count = self.streaks.get(pid, (None, 0))
+        count = count + 1 if role == last_role else 1
+        self.streaks[pid] = (role, count)
+        return count
+
+
+def get_role(player: BasePlayer, state):
+    if player.is_active_rep:
+        return 'rep'
+    if player.is_voter:
+        return 'voter'
+    if player.participant_id in state.dropped:
+        return 'dropped'
+    return 'removed' if player.participant_id in state.served_as_rep else 'pool'
+
+
+def is_after_game(player: BasePlayer, state):
+    """The player's round comes after the round their cohort's game ended in."""
+    end_round = state.end_rounds.get(player.cohort)
+    return player.game_ended or (end_round is not None and player.round_number > end_round)
+
+
+def export_rows(players, C, removal_reason):
+    """Yields the header and one row per player. removal_reason(group) says why the
+    group's rep was removed this round; it is only called for groups with a removal."""
+    yield HEADER
+    state = None
+    for player in players:
+        if player.field_maybe_none('cohort') is None:
+            # a round that was never set up (see round_engine)
+            continue
+        session = player.session
+        if state is None or state.session_id != session.id:
+            state = _SessionState(player.subsession)
+        if is_after_game(player, state):
+            continue
+        state.start_round(player.subsession)
+
+        group = player.group
+        participant = player.participant
+        pid = participant.id
+        role = get_role(player, state)
+        if role == 'rep':
+            state.served_as_rep.add(pid)
+        tenure = state.update_streak(pid, role)
+
+        active = role in ('rep', 'voter')
+        if active:
+            state.current_multipliers[group.cohort] = (group.voter_multiplier, group.rep_multiplier)
+            # Stage 2 changes the group's multipliers at the end of the round, so the ones in
+            # effect are those carried over from the cohort's previous round.
+            voter_multiplier, rep_multiplier = state.previous_multipliers.get(
+                group.cohort, (C.BASE_VOTER_SUCCESS_PAYOFF, C.BASE_REP_SUCCESS_PAYOFF)
+            )
+            rep_removed = group.rep_was_removed_this_round
+            reason = removal_reason(group) if rep_removed else None
+        else:
+            voter_multiplier = rep_multiplier = None
+            rep_removed = None
+            reason = 'dropout' if pid in state.dropped_reps else None
+
+        vote = player.field_maybe_none('vote_choice')
+        decision = player.field_maybe_none('stage2_decision') if role == 'rep' else None
+        yield [
+            session.code,
+            participant.code,
+            participant.id_in_session,
+            player.round_number,
+            player.cohort,
+            role,
+            tenure,
+            '' if vote is None else ('Replace' if vote else 'Keep'),
+            group.num_remove_votes if active else None,
+            rep_removed,
+            reason,
+            STAGE2_LABELS.get(decision),
+            voter_multiplier,
+            rep_multiplier,
+            player.field_maybe_none('slider_score'),
+            player.payoff,
+            player.auto_filled,
+        ]
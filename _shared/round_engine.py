@@ -0,0 +1,45 @@
+from otree.api import *
+import importlib
+
+# Deferred round setup for the rotation treatments (apps 3-6).
+# A rotation game often ends well before C.NUM_ROUNDS (the rep pool runs out, or the
+# indefinite horizon stops it), but creating_session() sets up every round when the
+# session is created. With lazy_rounds=True in the session config, creating_session()
+# only sets up round 1, and each later round is set up by start_round() in the round's
+# InitializeRoundWaitPage, which every participant still in the game passes first.
+# Rounds nobody reaches are never set up: their players keep cohort None. The custom
+# export leaves them out, as it leaves out every round after a cohort's game ended
+# with or without this option (see rotation_export).
+#
+# This is not lazy creation of the rounds. oTree still creates the Subsession, Group
+# and Player rows of every round with the session: it needs a Player row for every page
+# a participant goes past, including the rounds skipped once their cohort's game is
+# over. What is deferred is the app's own per-round setup, which after round 1 is only
+# writing each player's cohort (rotation_engine.assign_cohorts()); the cohorts' status
+# rows are created once, in round 1, and the groups are formed as each round starts
+# either way. So all the option saves is those writes for the rounds nobody reaches:
+# session creation gets about a quarter faster, and the database is no smaller.
+#
+# A deferred round records that it has been set up in its Subsession's set_up_late field.
+#
+# Session config:
+#   lazy_rounds  set up rounds as they start instead of at session creation (default False)
+
+
+def is_lazy(session):
+    return session.config.get('lazy_rounds', False)
+
+
+def defer_round(subsession: BaseSubsession):
+    """Call first in creating_session(): True if the round's setup is left to start_round().
+    The round's oTree rows are created all the same (see above)."""
+    return is_lazy(subsession.session) and subsession.round_number > 1 and not subsession.set_up_late
+
+
+def start_round(subsession: BaseSubsession):
+    """Call first in the after_all_players_arrive() of the round's first wait page.
+    Runs the app's creating_session() for a round that defer_round() skipped."""
+    if not defer_round(subsession):
+        return
+    subsession.set_up_late = True
+    importlib.import_module(subsession.get_folder_name()).creating_session(subsession)
@@ -0,0 +1,124 @@
+"""Warm pool of pre-created sessions.
+
+Creating a large session (e.g. Full_Experiment with 100+ participants) runs every
+app's creating_session for every round, which is slow enough to hold up the start of
+a lab session. This command creates sessions ahead of time and hands one out instantly.
+Pooled sessions are ordinary sessions labelled "pool:<config>:<participants>", so they
+also show up in the admin's session list.
+
+From the project folder:
+
+    python -m _shared.session_pool fill Full_Experiment --participants 120 --size 2
+    python -m _shared.session_pool fill Full_Experiment --participants 120 --size 2 --watch 60
+    python -m _shared.session_pool take Full_Experiment --participants 120 --room econ_lab --label "Tuesday 10am"
+    python -m _shared.session_pool status
+
+fill creates sessions until the pool holds --size unclaimed ones; with --watch it keeps
+running in the background and tops the pool up every that many seconds. take relabels
+the oldest pooled session, optionally opens it in a room, and prints its links.
+A room's session is a row in the database, which the server reads on every visit to
+the room, so take works while the server runs; no restart is needed.
+Uses the database of the server (DATABASE_URL). The devserver keeps its database in
+memory while running and never sees what these commands write then: with it, fill
+and take before starting the server.
+"""
+import argparse
+import time
+
+LABEL_PREFIX = 'pool'
+
+
+def pool_label(config_name, num_participants):
+    return f'{LABEL_PREFIX}:{config_name}:{num_participants}'
+
+
+def get_pooled(config_name, num_participants):
+    """The unclaimed pooled sessions of a config and size, oldest first."""
+    from otree.models import Session
+    label = pool_label(config_name, num_participants)
+    return list(Session.objects_filter(label=label).order_by(Session.id))
+
+
+def fill(config_name, num_participants, size):
+    """Creates sessions until the pool holds size of them. Returns how many were created."""
+    from otree.session import create_session
+    missing = size - len(get_pooled(config_name, num_participants))
+    for _ in range(missing):
+        start = time.perf_counter()
+        session = create_session(
+            config_name, num_participants=num_participants, label=pool_label(config_name, num_participants),
+        )
+        print(f'Created {session.code} ({config_name}, {num_participants} participants) in {time.perf_counter() - start:.1f}s')
+    return max(missing, 0)
+
+
+def take(config_name, num_participants, room_name=None, label=''):
+    """Claims the oldest pooled session: gives it its real label and optionally opens it in a room."""
+    pooled = get_pooled(config_name, num_participants)
+    if not pooled:
+        return None
+    session = pooled[0]
+    session.label = label
+    if room_name:
+        from _shared import otree_internals
+        otree_internals.open_in_room(room_name, session)
+    return session
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-create sessions and hand them out instantly.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    for name in ['fill', 'take']:
+        command = commands.add_parser(name)
+        command.add_argument('config')
+        command.add_argument('--participants', type=int, help="default: the config's num_demo_participants")
+    commands.choices['fill'].add_argument('--size', type=int, default=1, help='sessions to keep in the pool')
+    commands.choices['fill'].add_argument('--watch', type=int, metavar='SECONDS', help='keep topping the pool up')
+    commands.choices['take'].add_argument('--room', help='open the session in this room')
+    commands.choices['take'].add_argument('--label', default='', help='label of the session')
+    commands.add_parser('status')
+    args = parser.parse_args()
+
+    from otree.main import setup
+    setup()
+    from otree.database import db
+    from otree.models import Session
+    from otree.room import ROOM_DICT
+    from otree.session import SESSION_CONFIGS_DICT
+
+    from _shared import otree_internals
+
+    if args.command == 'status':
+        counts = {}
+        for session in Session.objects_filter(Session.label.startswith(f'{LABEL_PREFIX}:')):
+            counts[session.label] = counts.get(session.label, 0) + 1
+        for label, count in sorted(counts.items()):
+            print(f'{label}: {count}')
+        return
+
+    if args.config not in SESSION_CONFIGS_DICT:
+        parser.error(f'no session config named {args.config}')
+    num_participants = args.participants or SESSION_CONFIGS_DICT[args.config]['num_demo_participants']
+    if args.command == 'take' and args.room and args.room not in ROOM_DICT:
+        parser.error(f"no room named {args.room}, choose from {', '.join(ROOM_DICT) or 'none (see ROOMS in settings.py)'}")
+
+    if args.command == 'fill':
+        while True:
+            fill(args.config, num_participants, args.size)
+            db.commit()
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+    else:
+        session = take(args.config, num_participants, args.room, args.label)
+        if session is None:
+            raise SystemExit(f'The pool has no {args.config} session for {num_participants} participants; run fill first.')
+        db.commit()
+        print(f'Session {session.code}: session-wide link {otree_internals.session_wide_link(session)}')
+        if args.room:
+            print(f'Opened in room {args.room}: /room/{args.room}')
+        print(f'{len(get_pooled(args.config, num_participants))} left in the pool')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+from otree.api import *
+from array import array
+import base64
+import time
+
+from _shared import rng_engine
+
+# Server side of the slider task (SliderTask pages of the treatment apps).
+# The server decides every goal and checks every answer; the browser only displays
+# them. It reveals GOALS_AHEAD goals at a time, the next ones only in reply to the
+# answers to the previous ones. The browser queues its answers and sends them in one
+# live message once it has answered every goal it holds, and when the page is
+# submitted, so a participant dragging sliders for a minute costs a handful of
+# messages rather than one per release.
+#
+# Each answer carries its latency as the browser timed it, from its goal being shown to
+# the slider being released, and every answer of a batch is checked on its own: it must
+# be for the next slider, take at least MIN_ANSWER_MS, and the batch's latencies so far,
+# plus the NEXT_GOAL_DELAY_MS feedback pause the browser shows after each release, must
+# fit into the time since the server counts the batch's first goal as shown, by the
+# server's clock (give or take JITTER_MS, as each batch has its own network delay). So
+# no client can answer much faster than a person could, whatever it reports. The first
+# answer that fails is ignored along with the rest of the batch. On top of that the
+# attempts are capped by the time since the page loaded.
+#
+# Attempts are kept in the player's `slider_attempts` field as a packed array of
+# unsigned ints, three per attempt: goal, submitted value, latency in ms. The player's
+# `slider_started_at` and `slider_shown_at` hold the time the page first loaded and
+# the time the first goal not yet answered is shown.
+
+SLIDER_MIN = 1
+SLIDER_MAX = 50
+FIELDS_PER_ATTEMPT = 3
+MAX_LATENCY_MS = 10 * 60 * 1000
+# Nobody reads a goal and sets the slider to it faster
+MIN_ANSWER_MS = 250
+# Must match the feedback pause in the SliderTask.html pages
+NEXT_GOAL_DELAY_MS = 1200
+# Goals revealed at a time, and so answers per batch
+GOALS_AHEAD = 5
+# How much longer than the server measured a batch's latencies may add up to, since each
+# batch reaches the server with its own network delay
+JITTER_MS = 500
+
+
+def get_goal(player: BasePlayer, index):
+    """The goal of the player's index-th slider in this round. Drawn from the session's
+    slider stream, so it needs no storage and cannot be chosen by the browser."""
+    rng = rng_engine.stream(player, rng_engine.SLIDERS, player.participant.id_in_session, player.round_number, index)
+    return rng.randint(SLIDER_MIN, SLIDER_MAX)
+
+
+def load_attempts(player: BasePlayer):
+    packed = array('I')
+    if player.slider_attempts:
+        packed.frombytes(base64.b64decode(player.slider_attempts))
+    return packed
+
+
+def save_attempts(player: BasePlayer, packed):
+    player.slider_attempts = base64.b64encode(packed.tobytes()).decode('ascii')
+
+
+def get_attempts(player: BasePlayer):
+    """The player's attempts as (goal, value, latency_ms) tuples, e.g. for exports."""
+    packed = load_attempts(player)
+    return [tuple(packed[i:i + FIELDS_PER_ATTEMPT]) for i in range(0, len(packed), FIELDS_PER_ATTEMPT)]
+
+
+def max_attempts(player: BasePlayer, now):
+    """Attempts the time since the page loaded allows: the first goal is shown at once,
+    every later one after the feedback pause, and no answer takes less than MIN_ANSWER_MS."""
+    elapsed_ms = (now - player.slider_started_at) * 1000
+    return int((elapsed_ms + NEXT_GOAL_DELAY_MS) // (MIN_ANSWER_MS + NEXT_GOAL_DELAY_MS))
+
+
+def get_goals(player: BasePlayer, num_attempts):
+    return [[index, get_goal(player, index)] for index in range(num_attempts, num_attempts + GOALS_AHEAD)]
+
+
+def parse_attempt(entry):
+    """(index, value, latency_ms) of a batched answer, or None if it is malformed."""
+    if not isinstance(entry, (list, tuple)) or len(entry) != 3:
+        return None
+    try:
+        return tuple(int(field) for field in entry)
+    except (TypeError, ValueError):
+        return None
+
+
+def live_slider(player: BasePlayer, data):
+    """live_method of the SliderTask pages.
+    {'type': 'load'} -> current score, and the next GOALS_AHEAD sliders as [index, goal].
+    {'type': 'attempts', 'attempts': [[index, value, latency_ms], ...]} -> records the
+    answers that continue the player's sequence and pass the checks above (anything else
+    is a resend, malformed or too fast, and is ignored), updates slider_score and replies
+    like 'load'."""
+    now = time.time()
+    if player.field_maybe_none('slider_started_at') is None:
+        player.slider_started_at = now
+        player.slider_shown_at = now
+    packed = load_attempts(player)
+    num_attempts = len(packed) // FIELDS_PER_ATTEMPT
+    attempts = data.get('attempts') if isinstance(data, dict) and data.get('type') == 'attempts' else None
+    if isinstance(attempts, list):
+        elapsed_ms = (now - player.slider_shown_at) * 1000
+        last_revealed = num_attempts + GOALS_AHEAD
+        answered_ms = 0
+        num_recorded = 0
+        for entry in attempts:
+            attempt = parse_attempt(entry)
+            if attempt is None:
+                break
+            index, value, latency_ms = attempt
+            if index != num_attempts or index >= last_revealed or num_attempts >= max_attempts(player, now):
+                break
+            answered_ms += latency_ms + (NEXT_GOAL_DELAY_MS if num_recorded else 0)
+            if latency_ms < MIN_ANSWER_MS or answered_ms > elapsed_ms + JITTER_MS:
+                break
+            goal = get_goal(player, index)
+            value = min(max(value, SLIDER_MIN), SLIDER_MAX)
+            packed.extend([goal, value, min(latency_ms, MAX_LATENCY_MS)])
+            if value == goal:
+                player.slider_score += 1
+            num_attempts += 1
+            num_recorded += 1
+        if num_recorded:
+            save_attempts(player, packed)
+            player.slider_shown_at = now + NEXT_GOAL_DELAY_MS / 1000
+    return {player.id_in_group: dict(score=player.slider_score, goals=get_goals(player, num_attempts))}
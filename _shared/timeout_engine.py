@@ -0,0 +1,52 @@
+from otree.api import *
+
+# Timeouts for every page a participant has to click through, so one idle browser
+# cannot stall a group or the whole session at the next wait page.
+# Each page names a policy: its timeout in seconds and, for decision pages, the
+# decision taken when the timer runs out. A timed-out decision page always gets the
+# defaults, whatever was selected but not submitted, and the filled fields are listed
+# in the player's `auto_filled` field.
+#
+# Session config:
+#   timeout_<policy>  overrides the seconds of one policy (e.g. timeout_vote=90)
+#   timeout_scale     multiplies all of them (e.g. 0.25 for rehearsals)
+
+POLICIES = dict(
+    name=dict(seconds=120, defaults=dict(player_name='Anonymous')),
+    dictator=dict(seconds=60, defaults=dict(dictator_send=0)),
+    offer=dict(seconds=60, defaults=dict(ultimatum_offer=0)),
+    respond=dict(seconds=60, defaults=dict(ultimatum_accepted=False)),  # Reject
+    destroy=dict(seconds=60, defaults=dict(jod_destroy=False)),  # Do nothing
+    vote=dict(seconds=60, defaults=dict(vote_choice=False)),  # Keep
+    stage2=dict(seconds=60, defaults=dict(stage2_decision=0)),  # Neutral
+    # Status and results pages, which have no decision. The final results pages
+    # (TotalResults) use it only when another app follows; on the session's last app
+    # they have no timeout, so nobody is moved off their earnings.
+    info=dict(seconds=45, defaults={}),
+)
+
+
+def get_timeout_seconds(player: BasePlayer, policy):
+    config = player.session.config
+    seconds = config.get(f'timeout_{policy}', POLICIES[policy]['seconds'])
+    return seconds * config.get('timeout_scale', 1)
+
+
+def get_default(policy, field):
+    return POLICIES[policy]['defaults'][field]
+
+
+def record_auto_filled(player: BasePlayer, field):
+    filled = [f for f in player.auto_filled.split(',') if f]
+    if field not in filled:
+        filled.append(field)
+    player.auto_filled = ','.join(filled)
+
+
+def fill_defaults(player: BasePlayer, policy, timeout_happened):
+    """Call from before_next_page of a decision page: on timeout, applies the policy's defaults."""
+    if not timeout_happened:
+        return
+    for field, value in POLICIES[policy]['defaults'].items():
+        setattr(player, field, value)
+        record_auto_filled(player, field)
@@ -0,0 +1,86 @@
+from otree.api import *
+import math
+
+from _shared import timeout_engine
+
+# Live voting on the active rep (VotingPage of the rotation apps).
+# Votes arrive through the page's live_method and are added to the group's tally
+# (Group.num_votes_cast / num_remove_votes) as they come in. The vote is resolved
+# as soon as its outcome is certain: when the last voter is in, or earlier when the
+# remaining votes can no longer change the result under the session's rule.
+# Each app passes an on_resolved(group, passed) callback that applies the outcome,
+# so the apps only need a group-level wait page after voting, not a session-wide one.
+#
+# A rule takes (replace_votes, num_voters) and says whether the rep is replaced.
+# Rules must be monotone in replace_votes, which is what makes early resolution safe.
+
+
+def majority(replace_votes, num_voters):
+    return replace_votes > num_voters / 2
+
+
+def supermajority(replace_votes, num_voters):
+    return replace_votes >= math.ceil(num_voters * 2 / 3)
+
+
+def unanimity(replace_votes, num_voters):
+    return replace_votes == num_voters
+
+
+RULES = dict(
+    majority=majority,
+    supermajority=supermajority,
+    unanimity=unanimity,
+)
+
+
+def get_rule(session):
+    """The decision rule of the session (session config 'vote_rule', default 'majority')."""
+    return RULES[session.config.get('vote_rule', 'majority')]
+
+
+def vote_passed(group: BaseGroup, num_voters):
+    """Whether the group's tally replaces the rep under the session's rule."""
+    return get_rule(group.session)(group.num_remove_votes, num_voters)
+
+
+def cast_vote(player: BasePlayer, replace, num_voters, on_resolved):
+    """Records one voter's vote in the group tally and resolves the vote once its
+    outcome can no longer change. Repeated votes from the same player are ignored."""
+    group = player.group
+    if not player.is_voter or player.field_maybe_none('vote_choice') is not None:
+        return
+    player.vote_choice = replace
+    group.num_votes_cast += 1
+    if replace:
+        group.num_remove_votes += 1
+    rule = get_rule(player.session)
+    remaining = num_voters - group.num_votes_cast
+    if rule(group.num_remove_votes, num_voters) == rule(group.num_remove_votes + remaining, num_voters):
+        resolve(group, num_voters, on_resolved)
+
+
+def resolve(group: BaseGroup, num_voters, on_resolved):
+    """Applies the outcome once. Also called by the wait page after voting, which
+    covers votes that never came in and rounds where nobody votes."""
+    if group.vote_resolved:
+        return
+    group.vote_resolved = True
+    on_resolved(group, vote_passed(group, num_voters))
+
+
+def live_vote(player: BasePlayer, data, num_voters, on_resolved):
+    """live_method of the VotingPage: {'replace': true/false} casts the player's vote.
+    Any other value of 'replace' (e.g. the string "false") is ignored, never counted."""
+    replace = data.get('replace') if isinstance(data, dict) else None
+    if replace is True or replace is False:
+        cast_vote(player, replace, num_voters, on_resolved)
+    return {player.id_in_group: dict(voted=player.field_maybe_none('vote_choice') is not None)}
+
+
+def cast_default_vote(player: BasePlayer, timeout_happened, num_voters, on_resolved):
+    """before_next_page of the VotingPage: a voter whose timer ran out before voting
+    casts the timeout default (Keep), recorded as auto-filled."""
+    if timeout_happened and player.is_voter and player.field_maybe_none('vote_choice') is None:
+        cast_vote(player, timeout_engine.get_default('vote', 'vote_choice'), num_voters, on_resolved)
+        timeout_engine.record_auto_filled(player, 'vote_choice')
@@ -1,5 +1,7 @@
 from otree.api import *
 
+from _shared import journal, timeout_engine
+
 doc = "A simple, one-page app to collect the participant's name and set it as their label."
 
 class C(BaseConstants):
@@ -20,16 +22,25 @@ class Player(BasePlayer):
         label="Please enter your first name or a nickname:",
         blank=False # This makes the field required
     )
+    # Decisions filled in by a timeout (see timeout_engine)
+    auto_filled = models.StringField(initial='')
 
 class NamePage(Page):
     form_model = 'player'
     form_fields = ['player_name']
 
+    @staticmethod
+    def get_timeout_seconds(player: Player):
+        return timeout_engine.get_timeout_seconds(player, 'name')
+
     @staticmethod
     def before_next_page(player: Player, timeout_happened):
+        # Without a name by the timeout, the participant is labelled with the default.
+        timeout_engine.fill_defaults(player, 'name', timeout_happened)
         # This is the key step. We take the name the player entered
         # and save it to the special 'participant.label' field.
         player.participant.label = player.player_name
         
         
-page_sequence = [NamePage]
\ No newline at end of file
+page_sequence = [NamePage]
+journal.attach(page_sequence)
@@ -0,0 +1,11 @@
+from otree.api import *
+from _shared.bots import make_player_bot
+from . import *
+
+
+def check_label(bot):
+    # The name entered becomes the participant's label
+    expect(bot.participant.label, 'Bot')
+
+
+PlayerBot = make_player_bot(page_sequence, choices=dict(player_name='Bot'), checks=[check_label])
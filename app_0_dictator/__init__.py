@@ -1,5 +1,7 @@
 from otree.api import *
 
+from _shared import journal, payments, rng_engine, timeout_engine
+
 # Defines constants for the app
 class C(BaseConstants):
     # Sets the app's URL name
@@ -17,12 +19,9 @@ class Subsession(BaseSubsession):
 
 # Function that runs at the beginning of each round
 def creating_session(subsession: Subsession):
-    # Randomly assigns players to new groups
-    subsession.group_randomly()
-    # Loops through each newly created group
-    for group in subsession.get_groups():
-        # Gets the two players in the group
-        p1, p2 = group.get_players()
+    # Randomly assigns players to new groups, from the session's seeded matching stream,
+    # and loops through the two players of each newly created group
+    for p1, p2 in rng_engine.group_randomly(subsession):
         # Assigns the 'Dictator' role to the first player
         p1.game_role = 'Dictator'
         # Assigns the 'Recipient' role to the second player
@@ -38,6 +37,8 @@ class Player(BasePlayer):
     game_role = models.StringField()
     # Stores the amount the Dictator sends
     dictator_send = models.IntegerField(min=0, max=C.DICTATOR_ENDOWMENT, label=f"How many tokens (0-{C.DICTATOR_ENDOWMENT}) do you want to send?")
+    # Stores the decisions that were filled in by a timeout (see timeout_engine)
+    auto_filled = models.StringField(initial='')
 
 # Defines the 'Decision' page
 class Decision(Page):
@@ -55,6 +56,14 @@ class Decision(Page):
     def vars_for_template(player: Player):
         # Passes the player's role to the template
         return dict(game_role=player.game_role)
+    # Ends the page after the session's timeout for this decision
+    @staticmethod
+    def get_timeout_seconds(player: Player):
+        return timeout_engine.get_timeout_seconds(player, 'dictator')
+    # Fills in the default decision if the timer ran out
+    @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        timeout_engine.fill_defaults(player, 'dictator', timeout_happened)
 
 # Defines the 'ResultsWaitPage'
 class ResultsWaitPage(WaitPage):
@@ -72,13 +81,21 @@ class ResultsWaitPage(WaitPage):
         dictator.payoff = C.DICTATOR_ENDOWMENT - sent
         # Calculates the Recipient's payoff
         recipient.payoff = sent
+        # Adds both payoffs to the participants' cross-app ledgers (see payments.py)
+        payments.record(dictator, dictator.payoff)
+        payments.record(recipient, recipient.payoff)
         
         # Saves the amount sent to a permanent participant variable
         dictator.participant.vars[f'dictator_send_r{dictator.round_number}'] = sent
 
 # Defines the 'Results' page
 class Results(Page):
-    pass
+    # Moves on by itself after the session's timeout for results pages
+    @staticmethod
+    def get_timeout_seconds(player: Player):
+        return timeout_engine.get_timeout_seconds(player, 'info')
 
 # Defines the order of pages in the app
-page_sequence = [Decision, ResultsWaitPage, Results]
\ No newline at end of file
+page_sequence = [Decision, ResultsWaitPage, Results]
+# Journals every form submission and live message of these pages
+journal.attach(page_sequence)
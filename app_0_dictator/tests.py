@@ -0,0 +1,13 @@
+from otree.api import *
+from _shared.bots import make_player_bot, check_ledger
+from . import *
+
+
+def check_payoffs(bot):
+    # The dictator keeps whatever is not sent
+    dictator, recipient = sorted(bot.group.get_players(), key=lambda p: p.game_role != 'Dictator')
+    expect(recipient.payoff, dictator.dictator_send)
+    expect(dictator.payoff + recipient.payoff, C.DICTATOR_ENDOWMENT)
+
+
+PlayerBot = make_player_bot(page_sequence, checks=[check_payoffs, check_ledger])
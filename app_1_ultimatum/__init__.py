@@ -1,5 +1,7 @@
 from otree.api import *
 
+from _shared import journal, payments, rng_engine, timeout_engine
+
 # Defines constants for the app
 class C(BaseConstants):
     # Sets the app's URL name
@@ -17,12 +19,9 @@ class Subsession(BaseSubsession):
 
 # Function that runs at the beginning of each round
 def creating_session(subsession: Subsession):
-    # Randomly assigns players to new groups
-    subsession.group_randomly()
-    # Loops through each newly created group
-    for group in subsession.get_groups():
-        # Gets the two players in the group
-        p1, p2 = group.get_players()
+    # Randomly assigns players to new groups, from the session's seeded matching stream,
+    # and loops through the two players of each newly created group
+    for p1, p2 in rng_engine.group_randomly(subsession):
         # Assigns the 'Proposer' role to the first player
         p1.game_role = 'Proposer'
         # Assigns the 'Responder' role to the second player
@@ -40,6 +39,8 @@ class Player(BasePlayer):
     ultimatum_offer = models.IntegerField(min=0, max=C.ULTIMATUM_ENDOWMENT, label="How many tokens to offer?")
     # Stores the Responder's accept/reject decision
     ultimatum_accepted = models.BooleanField(widget=widgets.RadioSelect, choices=[[True, 'Accept'], [False, 'Reject']])
+    # Stores the decisions that were filled in by a timeout (see timeout_engine)
+    auto_filled = models.StringField(initial='')
 
 # Defines the 'Offer' page
 class Offer(Page):
@@ -57,6 +58,14 @@ class Offer(Page):
     def vars_for_template(player: Player):
         # Passes the player's role to the template
         return dict(game_role=player.game_role)
+    # Ends the page after the session's timeout for this decision
+    @staticmethod
+    def get_timeout_seconds(player: Player):
+        return timeout_engine.get_timeout_seconds(player, 'offer')
+    # Fills in the default decision if the timer ran out
+    @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        timeout_engine.fill_defaults(player, 'offer', timeout_happened)
 
 # Defines a wait page for synchronization
 class OfferWaitPage(WaitPage):
@@ -80,6 +89,14 @@ class Respond(Page):
         proposer = player.get_others_in_group()[0]
         # Passes the Proposer's offer and the player's role to the template
         return dict(offer=proposer.ultimatum_offer, game_role=player.game_role)
+    # Ends the page after the session's timeout for this decision
+    @staticmethod
+    def get_timeout_seconds(player: Player):
+        return timeout_engine.get_timeout_seconds(player, 'respond')
+    # Fills in the default decision if the timer ran out
+    @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        timeout_engine.fill_defaults(player, 'respond', timeout_happened)
 
 # Defines the 'ResultsWaitPage'
 class ResultsWaitPage(WaitPage):
@@ -104,6 +121,9 @@ class ResultsWaitPage(WaitPage):
             # Calculates payoffs if rejected
             proposer.payoff = 0
             responder.payoff = 0
+        # Adds both payoffs to the participants' cross-app ledgers (see payments.py)
+        payments.record(proposer, proposer.payoff)
+        payments.record(responder, responder.payoff)
             
         # Saves the Proposer's offer to a permanent participant variable
         proposer.participant.vars[f'ultimatum_offer_r{proposer.round_number}'] = offer
@@ -112,7 +132,12 @@ class ResultsWaitPage(WaitPage):
 
 # Defines the 'Results' page
 class Results(Page):
-    pass
+    # Moves on by itself after the session's timeout for results pages
+    @staticmethod
+    def get_timeout_seconds(player: Player):
+        return timeout_engine.get_timeout_seconds(player, 'info')
 
 # Defines the order of pages in the app
-page_sequence = [Offer, OfferWaitPage, Respond, ResultsWaitPage, Results]
\ No newline at end of file
+page_sequence = [Offer, OfferWaitPage, Respond, ResultsWaitPage, Results]
+# Journals every form submission and live message of these pages
+journal.attach(page_sequence)
@@ -0,0 +1,23 @@
+from otree.api import *
+from _shared.bots import make_player_bot, check_ledger
+from . import *
+
+
+def respond(player: Player):
+    # Responders accept any offer of at least 30 tokens
+    proposer = player.get_others_in_group()[0]
+    return proposer.ultimatum_offer >= 30
+
+
+def check_payoffs(bot):
+    # An accepted offer splits the endowment, a rejected one pays nobody
+    proposer, responder = sorted(bot.group.get_players(), key=lambda p: p.game_role != 'Proposer')
+    expect(responder.ultimatum_accepted, respond(responder))
+    if responder.ultimatum_accepted:
+        expect(responder.payoff, proposer.ultimatum_offer)
+        expect(proposer.payoff + responder.payoff, C.ULTIMATUM_ENDOWMENT)
+    else:
+        expect(proposer.payoff + responder.payoff, 0)
+
+
+PlayerBot = make_player_bot(page_sequence, choices=dict(ultimatum_accepted=respond), checks=[check_payoffs, check_ledger])
@@ -0,0 +1,17 @@
+from otree.api import *
+from _shared.bots import make_player_bot, check_ledger
+from . import *
+
+
+def check_payoffs(bot):
+    # Destroying costs the destroyer JOD_COST and the target JOD_HARM
+    destroyer, target = sorted(bot.group.get_players(), key=lambda p: p.game_role != 'Destroyer')
+    if destroyer.jod_destroy:
+        expect(destroyer.payoff, C.JOD_ENDOWMENT - C.JOD_COST)
+        expect(target.payoff, C.JOD_ENDOWMENT - C.JOD_HARM)
+    else:
+        expect(destroyer.payoff, C.JOD_ENDOWMENT)
+        expect(target.payoff, C.JOD_ENDOWMENT)
+
+
+PlayerBot = make_player_bot(page_sequence, checks=[check_payoffs, check_ledger])
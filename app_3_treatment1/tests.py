@@ -0,0 +1,19 @@
+from otree.api import *
+from _shared.bots import make_player_bot, check_dropout, check_export, check_history, check_ledger, check_terms, play_sliders
+from . import *
+
+
+def gone(player: Player, case):
+    # In the rep_dropout case, round 1's rep leaves the lab for good
+    return case == 'rep_dropout' and player.in_round(1).is_active_rep
+
+
+# SliderTask ends on its timer in the lab, so the bots let it time out as well.
+# The rep who leaves is taken out of office once they miss dropout_missed_pages SliderTask
+# pages; debug_dropout sets that below the term limit, so the substitution replaces them.
+PlayerBot = make_player_bot(
+    page_sequence, timeouts=[SliderTask], no_button=[TotalResults],
+    live={SliderTask: play_sliders},
+    checks=[check_history, check_terms(C.TERM_LIMIT), check_ledger, check_export(custom_export), check_dropout(gone)],
+    cases=['basic', 'rep_dropout'], gone=gone,
+)
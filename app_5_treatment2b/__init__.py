@@ -1,5 +1,6 @@
 from otree.api import *
-import random
+
+from _shared import dropout_engine, journal, rng_engine, rotation_checkpoint, rotation_engine, rotation_export, round_engine, slider_engine, timeout_engine, vote_engine
 
 doc = 'Treatment 2b (Betrayal): Voters can remove the representative at any round end, but randomly backfires.'
 
@@ -18,38 +19,55 @@ class C(BaseConstants):
     OPPOSITE_OUTCOME_PROB = 0.40 # 40% "chaos" probability
 
 class Subsession(BaseSubsession):
-    rep_was_removed_this_round = models.BooleanField(initial=False)
+    # id_in_subsession of each cohort's active group, comma-separated in cohort order
+    active_group_ids = models.StringField()
+    # Rotation state at the start of this round, as JSON (see rotation_checkpoint)
+    rotation_checkpoint = models.LongStringField(initial='')
+    # Dropouts taken out of their cohort at the start of this round (see rotation_engine.substitute_dropouts)
+    substitutions = models.LongStringField(initial='')
+    # Set once lazy_rounds has deferred this round's setup to its start and it has run (see round_engine)
+    set_up_late = models.BooleanField(initial=False)
 
 def creating_session(subsession: Subsession):
     # Session Initialization
-    # This function runs once in Round 1 to set up the permanent roles and pools for the entire session.
-    session = subsession.session
+    # Round 1 splits the participants into cohorts with permanent voters and rep pools;
+    # every round then records each player's cohort.
+    # With lazy_rounds, the rounds after the first are set up as they start (see round_engine).
+    if round_engine.defer_round(subsession):
+        return
     if subsession.round_number == 1:
-        participants = session.get_participants()
-        random.shuffle(participants)
-        voter_participants = participants[:C.NUM_VOTERS]
-        rep_pool_participants = participants[C.NUM_VOTERS:]
-        session.vars['voter_pids'] = [p.id for p in voter_participants]
-        session.vars['rep_pool_pids'] = [p.id for p in rep_pool_participants]
-        session.vars['removed_pids'] = []
-        if session.vars['rep_pool_pids']:
-            session.vars['current_rep_pid'] = session.vars['rep_pool_pids'].pop(0)
-        else:
-            session.vars['current_rep_pid'] = None
-        session.vars['game_over'] = False
+        rotation_engine.create_cohorts(subsession, C.NUM_VOTERS)
+        rotation_engine.schedule_terminations(subsession, C.INDEFINITE_HORIZON_START_ROUND, C.CONTINUATION_PROBABILITY, C.NUM_ROUNDS)
+    rotation_engine.assign_cohorts(subsession)
     
 class Group(BaseGroup):
+    cohort = models.IntegerField()
+    rep_was_removed_this_round = models.BooleanField(initial=False)
+    # Live vote tally, kept up to date as votes arrive (see vote_engine)
     num_remove_votes = models.IntegerField(initial=0)
+    num_votes_cast = models.IntegerField(initial=0)
+    vote_resolved = models.BooleanField(initial=False)
     collective_pot = models.FloatField(initial=0)
     voter_multiplier = models.FloatField(initial=C.BASE_VOTER_SUCCESS_PAYOFF)
     rep_multiplier = models.FloatField(initial=C.BASE_REP_SUCCESS_PAYOFF)
 
 class Player(BasePlayer):
+    cohort = models.IntegerField()
     vote_choice = models.BooleanField(label='Do you want to replace the current representative?', choices=[[True, 'Replace'], [False, 'Keep']], widget=widgets.RadioSelect)
     is_voter = models.BooleanField(initial=False)
     is_active_rep = models.BooleanField(initial=False)
     stage2_decision = models.IntegerField(label="Make your legacy decision.", choices=[[1, 'Sabotage'],[0, 'Neutral'],[2, 'Help']])
+    # Set by the server as slider attempts come in (see slider_engine), never by the form.
     slider_score = models.IntegerField(initial=0)
+    # Packed (goal, value, latency_ms as the browser timed it) per slider attempt; read with slider_engine.get_attempts()
+    slider_attempts = models.LongStringField(initial='')
+    # Server times of the SliderTask page's first load and of the current goal being shown
+    slider_started_at = models.FloatField()
+    slider_shown_at = models.FloatField()
+    # Decisions filled in by a timeout (see timeout_engine)
+    auto_filled = models.StringField(initial='')
+    # The cohort's game ended in an earlier round (see rotation_engine.finish_games)
+    game_ended = models.BooleanField(initial=False)
 
 class InitializeRoundWaitPage(WaitPage):
     wait_for_all_groups = True
@@ -58,293 +76,327 @@ class InitializeRoundWaitPage(WaitPage):
         # Per-Round Setup
         # This logic runs at the start of every round to assign roles and create groups.
         
-        # 1. Assign player roles (Voter, Representative, Inactive) for this round.
-        voter_pids = subsession.session.vars['voter_pids']
-        current_rep_pid = subsession.session.vars.get('current_rep_pid')
-        for p in subsession.get_players():
-            pid = p.participant.id
-            if pid in voter_pids: p.is_voter = True; p.is_active_rep = False
-            elif pid == current_rep_pid: p.is_voter = False; p.is_active_rep = True
-            else: p.is_voter = False; p.is_active_rep = False
-        # 2. Create the group structure for this round (one active group, inactive players in solo groups).
-        active_players = [p for p in subsession.get_players() if p.is_voter or p.is_active_rep]
-        inactive_players = [p for p in subsession.get_players() if not (p.is_voter or p.is_active_rep)]
-        group_matrix = []
-        if active_players: group_matrix.append(active_players)
-        for p in inactive_players: group_matrix.append([p])
-        subsession.set_group_matrix(group_matrix)
-        # 3. Carry over the productivity multipliers from the previous round's active group.
-        active_group = next((g for g in subsession.get_groups() if len(g.get_players()) > 1), None)
-        if active_group:
-            if subsession.round_number > 1:
-                a_voter = next((p for p in active_group.get_players() if p.is_voter), None)
-                if a_voter:
-                    prev_group = a_voter.in_round(subsession.round_number - 1).group
-                    active_group.voter_multiplier = prev_group.voter_multiplier
-                    active_group.rep_multiplier = prev_group.rep_multiplier
+        # Set up the round here if lazy_rounds deferred it (see round_engine).
+        round_engine.start_round(subsession)
+        # 0. Take participants who dropped out out of their cohorts (see dropout_engine).
+        rotation_engine.substitute_dropouts(subsession)
+        # 1. Assign player roles (Voter, Representative, Inactive) for this round and
+        # 2. create the group structure (one active group per cohort, inactive players on one bench group).
+        rotation_engine.assign_roles(subsession)
+        # 3. Carry over the productivity multipliers the cohort's last Stage 2 decision set.
+        rotation_engine.carry_over_multipliers(subsession)
+        # 4. Checkpoint the rotation state at this round boundary (see rotation_checkpoint).
+        rotation_checkpoint.save(subsession)
 
 class Status(Page):
     @staticmethod
+    def get_timeout_seconds(player: Player):
+        return timeout_engine.get_timeout_seconds(player, 'info')
+    @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        dropout_engine.record_info_page(player, timeout_happened)
+    @staticmethod
     def is_displayed(player: Player):
-        if player.session.vars.get('game_over', False):
-            return False
-        return player.session.vars.get('current_rep_pid') is not None
+        return not rotation_engine.get_status(player).is_over
     @staticmethod
     def vars_for_template(player: Player):
+        cohort = rotation_engine.get_cohort(player)
         return {
-            'voter_pids': player.session.vars['voter_pids'],
-            'current_rep_pid': player.session.vars.get('current_rep_pid'),
-            'rep_pool_pids': player.session.vars['rep_pool_pids'],
-            'removed_pids': player.session.vars['removed_pids'],
+            'voter_pids': cohort.voter_pids,
+            'current_rep_pid': cohort.current_rep_pid,
+            'rep_pool_pids': cohort.rep_pool_pids,
+            'removed_pids': cohort.removed_pids,
         }
 
 class SliderTask(Page):
-    form_model = 'player'
-    form_fields = ['slider_score']
+    @staticmethod
+    def live_method(player: Player, data):
+        dropout_engine.heartbeat(player)
+        return slider_engine.live_slider(player, data)
     @staticmethod
     def get_timeout_seconds(player: Player):
         return player.session.config.get('slider_task_timeout', 60)
     @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        dropout_engine.record_slider_page(player, timeout_happened)
+    @staticmethod
     def vars_for_template(player: Player):
         if player.is_active_rep: contribution_rate = player.group.rep_multiplier
         else: contribution_rate = player.group.voter_multiplier
         return {'contribution_rate': contribution_rate}
     @staticmethod
     def is_displayed(player: Player):
-        if player.session.vars.get('game_over', False):
+        status = rotation_engine.get_status(player)
+        if status.game_over:
             return False
-        return (player.is_voter or player.is_active_rep) and player.session.vars.get('current_rep_pid') is not None
+        return (player.is_voter or player.is_active_rep) and status.current_rep_pid is not None
 
 class PayoffWaitPage(WaitPage):
-    wait_for_all_groups = True
+    # Group-level: each active group's pot only needs its own players' scores, so
+    # cohorts don't hold each other up here. The bench (inactive players) skips it.
     @staticmethod
-    def is_displayed(subsession: Subsession):
-        if subsession.session.vars.get('game_over', False):
-            return False
-        return subsession.session.vars.get('current_rep_pid') is not None
+    def is_displayed(player: Player):
+        return not rotation_engine.on_bench(player) and not rotation_engine.get_status(player).is_over
     @staticmethod
-    def after_all_players_arrive(subsession: Subsession):
-        active_group = next((g for g in subsession.get_groups() if len(g.get_players()) > 1), None)
-        if active_group:
-            rep = next((p for p in active_group.get_players() if p.is_active_rep), None)
-            voters = [p for p in active_group.get_players() if p.is_voter]
-            if rep and voters:
-                pot = (rep.slider_score * active_group.rep_multiplier + sum(p.slider_score for p in voters) * active_group.voter_multiplier)
-                active_group.collective_pot = pot
-                for p in voters: p.payoff = pot / C.NUM_VOTERS
-                rep.payoff = C.REP_SALARY
+    def after_all_players_arrive(group: Group):
+        rep = rotation_engine.get_rep(group)
+        voters = rotation_engine.get_voters(group)
+        if rep and voters:
+            pot = (rep.slider_score * group.rep_multiplier + sum(p.slider_score for p in voters) * group.voter_multiplier)
+            group.collective_pot = pot
+            status = rotation_engine.get_status(group)
+            for p in voters:
+                p.payoff = pot / C.NUM_VOTERS
+                rotation_engine.record_payoff(p, p.payoff, status)
+            rep.payoff = C.REP_SALARY
+            rotation_engine.record_payoff(rep, rep.payoff, status)
 
 class IncomeResults(Page):
     @staticmethod
+    def get_timeout_seconds(player: Player):
+        return timeout_engine.get_timeout_seconds(player, 'info')
+    @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        dropout_engine.record_info_page(player, timeout_happened)
+    @staticmethod
     def is_displayed(player: Player):
-        if player.session.vars.get('game_over', False):
+        status = rotation_engine.get_status(player)
+        if status.game_over:
             return False
-        return (player.is_voter or player.is_active_rep) and player.session.vars.get('current_rep_pid') is not None
+        return (player.is_voter or player.is_active_rep) and status.current_rep_pid is not None
     @staticmethod
     def vars_for_template(player: Player):
         group = player.group
-        rep = next((p for p in group.get_players() if p.is_active_rep), None)
-        voters = [p for p in group.get_players() if p.is_voter]
+        rep = rotation_engine.get_rep(group)
+        voters = rotation_engine.get_voters(group)
         if rep and voters:
             rep_contribution = rep.slider_score * group.rep_multiplier
             voters_total_contribution = sum(p.slider_score for p in voters) * group.voter_multiplier
             return {'rep_contribution': rep_contribution, 'voters_total_contribution': voters_total_contribution, 'collective_pot': group.collective_pot}
         return {}
 
+def apply_vote(group: Group, passed):
+    # --- NEW LOGIC FOR TREATMENT 2b (CHAOS) ---
+    rep = rotation_engine.get_rep(group)
+    if rep:
+        # 1. The vote gives the intended outcome
+        intended_to_be_removed = passed
+
+        # 2. Roll the die to see if the "opposite" outcome occurs
+        is_opposite_outcome = rng_engine.stream(group, rng_engine.CHAOS, group.cohort, group.round_number).random() < C.OPPOSITE_OUTCOME_PROB
+
+        # 3. Determine the final outcome
+        final_is_removed = False
+        if is_opposite_outcome:
+            # The opposite of the intended outcome happens
+            final_is_removed = not intended_to_be_removed
+        else:
+            # The intended outcome happens
+            final_is_removed = intended_to_be_removed
+        
+        # 4. If the final outcome is removal, update the state
+        if final_is_removed:
+            group.rep_was_removed_this_round = True
+            rep_pid = rep.participant.id
+            rotation_engine.get_cohort(group).remove_rep(rep_pid)
+
 class VotingPage(Page):
-    form_model = 'player'
-    form_fields = ['vote_choice']
+    @staticmethod
+    def live_method(player: Player, data):
+        dropout_engine.heartbeat(player)
+        return vote_engine.live_vote(player, data, C.NUM_VOTERS, apply_vote)
+    @staticmethod
+    def get_timeout_seconds(player: Player):
+        return timeout_engine.get_timeout_seconds(player, 'vote')
+    @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        dropout_engine.record_page(player, timeout_happened)
+        vote_engine.cast_default_vote(player, timeout_happened, C.NUM_VOTERS, apply_vote)
     @staticmethod
     def is_displayed(player: Player):
-        if player.session.vars.get('game_over', False):
+        status = rotation_engine.get_status(player)
+        if status.game_over:
             return False
-        return player.is_voter and player.session.vars.get('current_rep_pid') is not None
+        return player.is_voter and status.current_rep_pid is not None
     @staticmethod
     def vars_for_template(player: Player):
-        return {'active_rep_id': player.session.vars.get('current_rep_pid')}
+        return {'active_rep_id': rotation_engine.get_status(player).current_rep_pid}
 
 class SyncAfterVote(WaitPage):
-    wait_for_all_groups = True
+    # Group-level: the vote is normally resolved already, as the last vote came in.
     @staticmethod
-    def is_displayed(subsession: Subsession):
-        if subsession.session.vars.get('game_over', False):
-            return False
-        return subsession.session.vars.get('current_rep_pid') is not None
+    def is_displayed(player: Player):
+        return not rotation_engine.on_bench(player) and not rotation_engine.get_status(player).is_over
     @staticmethod
-    def after_all_players_arrive(subsession: Subsession):
-        active_group = next((g for g in subsession.get_groups() if len(g.get_players()) > 1), None)
-        if active_group:
-            rep = next((p for p in active_group.get_players() if p.is_active_rep), None)
-            if rep:
-                # --- NEW LOGIC FOR TREATMENT 2b (CHAOS) ---
-
-                # 1. Count votes to determine the intended outcome
-                voters = [p for p in active_group.get_players() if p.is_voter]
-                replace_votes = sum(1 for v in voters if v.field_maybe_none('vote_choice') is True)
-                active_group.num_remove_votes = replace_votes
-                
-                intended_to_be_removed = replace_votes > (C.NUM_VOTERS / 2)
-
-                # 2. Roll the die to see if the "opposite" outcome occurs
-                is_opposite_outcome = random.random() < C.OPPOSITE_OUTCOME_PROB 
-
-                # 3. Determine the final outcome
-                final_is_removed = False
-                if is_opposite_outcome:
-                    # The opposite of the intended outcome happens
-                    final_is_removed = not intended_to_be_removed
-                else:
-                    # The intended outcome happens
-                    final_is_removed = intended_to_be_removed
-                
-                # 4. If the final outcome is removal, update the state
-                if final_is_removed:
-                    subsession.rep_was_removed_this_round = True
-                    rep_pid = rep.participant.id
-                    if rep_pid not in subsession.session.vars['removed_pids']:
-                         subsession.session.vars['removed_pids'].append(rep_pid)
+    def after_all_players_arrive(group: Group):
+        # Resolves with the votes cast so far if the vote is still open
+        # (e.g. a voter never voted, or nobody voted this round).
+        if rotation_engine.get_rep(group):
+            vote_engine.resolve(group, C.NUM_VOTERS, apply_vote)
 
 class Stage2Decision(Page):
     form_model = 'player'
     form_fields = ['stage2_decision']
     @staticmethod
+    def get_timeout_seconds(player: Player):
+        return timeout_engine.get_timeout_seconds(player, 'stage2')
+    @staticmethod
     def is_displayed(player: Player):
-        if player.session.vars.get('game_over', False):
+        if rotation_engine.get_status(player).game_over:
             return False
         # T2a Display Rule
         # Show this page to the current representative IF they were just voted out in this round.
-        return player.is_active_rep and player.subsession.rep_was_removed_this_round
+        return player.is_active_rep and player.group.rep_was_removed_this_round
     @staticmethod
     def vars_for_template(player: Player):
         return dict(C=C)
     @staticmethod
     def before_next_page(player: Player, timeout_happened):
+        dropout_engine.record_page(player, timeout_happened)
+        # Neutral if the rep's timer ran out (see timeout_engine)
+        timeout_engine.fill_defaults(player, 'stage2', timeout_happened)
         decision = player.stage2_decision
         group = player.group
+        status = rotation_engine.get_status(player)
         if decision in [1, 2]: 
             player.payoff -= C.STAGE_2_COST
+            rotation_engine.record_payoff(player, -C.STAGE_2_COST, status)
         if decision == 1: 
             group.voter_multiplier = C.BASE_VOTER_SUCCESS_PAYOFF * 0.5
             group.rep_multiplier = C.BASE_REP_SUCCESS_PAYOFF * 0.5
-            player.session.vars['legacy_effect'] = "Sabotage"
+            status.legacy_effect = "Sabotage"
         elif decision == 2: 
             group.voter_multiplier = C.BASE_VOTER_SUCCESS_PAYOFF * 1.5
             group.rep_multiplier = C.BASE_REP_SUCCESS_PAYOFF * 1.5
-            player.session.vars['legacy_effect'] = "Help"
+            status.legacy_effect = "Help"
         else: 
             group.voter_multiplier = C.BASE_VOTER_SUCCESS_PAYOFF
             group.rep_multiplier = C.BASE_REP_SUCCESS_PAYOFF
-            player.session.vars['legacy_effect'] = "Neutral"
+            status.legacy_effect = "Neutral"
+        # The cohort's next active groups start from these (see rotation_engine)
+        rotation_engine.keep_multipliers(group)
 
 class PostDecisionWaitPage(WaitPage):
     @staticmethod
     def is_displayed(player: Player):
-        if player.session.vars.get('game_over', False):
+        if rotation_engine.get_status(player).game_over:
             return False
-        return player.subsession.rep_was_removed_this_round
+        return player.group.rep_was_removed_this_round
 
 class VotingResults(Page):
     @staticmethod
+    def get_timeout_seconds(player: Player):
+        return timeout_engine.get_timeout_seconds(player, 'info')
+    @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        dropout_engine.record_info_page(player, timeout_happened)
+    @staticmethod
     def is_displayed(player: Player):
-        if player.session.vars.get('game_over', False):
+        status = rotation_engine.get_status(player)
+        if status.game_over:
             return False
-        return (player.is_voter or player.is_active_rep) and player.session.vars.get('current_rep_pid') is not None
+        return (player.is_voter or player.is_active_rep) and status.current_rep_pid is not None
     @staticmethod
     def vars_for_template(player: Player):
-        session = player.session
-        active_group = next((g for g in player.subsession.get_groups() if len(g.get_players()) > 1), None)
-        if active_group:
-            replace_votes = active_group.num_remove_votes
-            vote_result = "Replace" if replace_votes > (C.NUM_VOTERS / 2) else "Keep"
-        else:
-            replace_votes = 0; vote_result = "N/A"
+        cohort = rotation_engine.get_cohort(player)
+        # Only active players see this page, so their own group is the cohort's active group.
+        replace_votes = player.group.num_remove_votes
+        vote_result = "Replace" if vote_engine.vote_passed(player.group, C.NUM_VOTERS) else "Keep"
         next_rep_pid = None
-        if vote_result == "Keep": next_rep_pid = session.vars.get('current_rep_pid')
+        if vote_result == "Keep": next_rep_pid = cohort.current_rep_pid
         else:
-            if session.vars['rep_pool_pids']: next_rep_pid = session.vars['rep_pool_pids'][0]
+            if cohort.rep_pool: next_rep_pid = cohort.next_rep_pid
             else: next_rep_pid = "None (Pool is empty)"
         return {'replace_votes': replace_votes, 'keep_votes': C.NUM_VOTERS - replace_votes, 'vote_result': vote_result, 'next_rep_pid': next_rep_pid}
 
 class EndOfRoundWaitPage(WaitPage):
+    # Session-wide, bench included: the callback decides whether each cohort's game is over,
+    # and with it whether the cohort's bench members see FinalWaitPage and TotalResults next,
+    # so none of them may get past this page first. A group-level page would let nobody go on
+    # sooner: everyone's next stop, FinalWaitPage or the next round's InitializeRoundWaitPage,
+    # waits for the whole session as well.
     wait_for_all_groups = True
     @staticmethod
-    def is_displayed(subsession: Subsession):
-        if subsession.session.vars.get('game_over', False):
-            return False
-        return subsession.session.vars.get('current_rep_pid') is not None
+    def is_displayed(player: Player):
+        return not rotation_engine.get_status(player).is_over
     @staticmethod
     def after_all_players_arrive(subsession: Subsession):
-        session = subsession.session
-        
-        # 1. Check for random termination First
-        if not session.vars['game_over'] and subsession.round_number >= C.INDEFINITE_HORIZON_START_ROUND:
-            if random.random() > C.CONTINUATION_PROBABILITY:
-                session.vars['game_over'] = True
-
-        # 2. Only if the game is not over, promote the next representative
-        if not session.vars['game_over']:
-            if subsession.rep_was_removed_this_round:
-                if session.vars['rep_pool_pids']: 
-                    session.vars['current_rep_pid'] = session.vars['rep_pool_pids'].pop(0)
+        removed_cohorts = {g.cohort for g in rotation_engine.active_groups(subsession) if g.rep_was_removed_this_round}
+        for index, cohort in enumerate(rotation_engine.get_cohorts(subsession)):
+            if cohort.is_over:
+                continue
+
+            # 1. Check for random termination First
+            if subsession.round_number == cohort.termination_round:
+                cohort.game_over = True
+
+            # 2. Only if the game is not over, promote the next representative
+            if not cohort.game_over:
+                if index in removed_cohorts:
                     # Note: rep_term_start_round is not needed for T2a, but is for T3
-                    session.vars['rep_term_start_round'] = subsession.round_number + 1
-                else: 
-                    session.vars['current_rep_pid'] = None
+                    cohort.promote_next_rep(subsession.round_number + 1)
 
 
 class TotalResults(Page):
+    # A next button only shows when another app follows, and then the page times out like
+    # the other results pages, or one idle participant would hold up the next app's first
+    # wait page for everyone. On the session's last app it stays up to be read.
+    @staticmethod
+    def get_timeout_seconds(player: Player):
+        if rotation_engine.has_next_app(player):
+            return timeout_engine.get_timeout_seconds(player, 'info')
+    @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        dropout_engine.record_info_page(player, timeout_happened)
     @staticmethod
     def is_displayed(player: Player):
-        pool_is_empty = player.session.vars.get('current_rep_pid') is None
-        random_end_triggered = player.session.vars.get('game_over', False)
-        is_max_round = player.round_number == C.NUM_ROUNDS
-
-        return pool_is_empty or random_end_triggered or is_max_round
+        return rotation_engine.shows_final_results(player, C.NUM_ROUNDS)
+    @staticmethod
+    def app_after_this_page(player: Player, upcoming_apps):
+        # The game is over: on to the next app, skipping the rest of this app's rounds
+        if upcoming_apps:
+            return upcoming_apps[0]
 
     @staticmethod
     def vars_for_template(player: Player):
-        session = player.session
-        total_voter_points = session.vars.get('total_voter_points', 0)
-        total_rep_points = session.vars.get('total_rep_points', 0)
+        status = rotation_engine.get_status(player)
+        total_voter_points = status.total_voter_points
+        total_rep_points = status.total_rep_points
         
         return {
             'total_voter_points': round(total_voter_points),
             'total_rep_points': round(total_rep_points),
             'your_total_points': round(player.participant.vars.get('total_payoff', 0)),
             'overall_total_points': round(total_voter_points + total_rep_points),
+            'has_next_app': rotation_engine.has_next_app(player),
         }
 
+
 class FinalWaitPage(WaitPage):
     wait_for_all_groups = True
     
     @staticmethod
     def is_displayed(player: Player):
-        pool_is_empty = player.session.vars.get('current_rep_pid') is None
-        random_end_triggered = player.session.vars.get('game_over', False)
-        is_max_round = player.round_number == C.NUM_ROUNDS
-
-        return pool_is_empty or random_end_triggered or is_max_round
+        return rotation_engine.shows_final_results(player, C.NUM_ROUNDS)
 
     @staticmethod
     def after_all_players_arrive(subsession: Subsession):
-        session = subsession.session
-        voter_pids = session.vars['voter_pids']
-        
-        total_voter_points = 0
-        total_rep_points = 0
-        
-        for p in subsession.get_players():
-            
-            personal_total = sum([p_in_round.payoff for p_in_round in p.in_all_rounds()])
-            p.participant.vars['total_payoff'] = personal_total
-            
-            if p.participant.id in voter_pids:
-                total_voter_points += personal_total
-            else: 
-                total_rep_points += personal_total
-        
-        session.vars['total_voter_points'] = total_voter_points
-        session.vars['total_rep_points'] = total_rep_points
+        # From the next round on, the members of the cohorts whose game is over skip every page.
+        rotation_engine.finish_games(subsession, C.NUM_ROUNDS)
+        # Totals are kept up to date in the cohort ledger as payoffs are set,
+        # so this only copies each participant's total across.
+        ledger = rotation_engine.get_ledger(subsession)
+        for p in rotation_engine.get_players(subsession):
+            p.participant.vars['total_payoff'] = ledger.get(p.participant.id, 0)
+
+
+def export_removal_reason(group: Group):
+    # A removal without a passed vote came from the opposite-outcome draw
+    return 'voted_out' if vote_engine.vote_passed(group, C.NUM_VOTERS) else 'opposite_outcome'
+
+def custom_export(players):
+    # One row per player and round; see rotation_export for the columns.
+    yield from rotation_export.export_rows(players, C, removal_reason=export_removal_reason)
 
 
 page_sequence = [
@@ -362,3 +414,5 @@ page_sequence = [
     FinalWaitPage,
     TotalResults,
 ]
+journal.attach(page_sequence)
+rotation_engine.skip_finished_rounds(page_sequence)
@@ -0,0 +1,17 @@
+from otree.api import *
+from _shared.bots import make_player_bot, check_export, check_history, check_ledger, check_terms, play_sliders, play_votes
+from . import *
+
+
+def vote(player: Player, case):
+    # Voters replace a rep whose round produced a small pot
+    return player.group.collective_pot < 300
+
+
+# SliderTask ends on its timer in the lab, so the bots let it time out as well.
+# Votes are cast through the live method; the VotingPage then submits itself.
+PlayerBot = make_player_bot(
+    page_sequence, timeouts=[SliderTask], no_button=[VotingPage, TotalResults],
+    live={SliderTask: play_sliders, VotingPage: play_votes(vote)},
+    checks=[check_history, check_terms(C.TERM_LIMIT), check_ledger, check_export(custom_export)],
+)
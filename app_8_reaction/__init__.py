@@ -1,5 +1,6 @@
 from otree.api import *
-import random
+
+from _shared import journal, rotation_checkpoint, rotation_engine, timeout_engine, vote_engine
 
 doc = 'Treatment 2a: Representatives who are voted out make an immediate final decision.'
 
@@ -11,52 +12,26 @@ class C(BaseConstants):
     STAGE_2_COST = 50
 
 class Subsession(BaseSubsession):
-    rep_was_removed_this_round = models.BooleanField(initial=False)
+    # id_in_subsession of each cohort's active group, comma-separated in cohort order
+    active_group_ids = models.StringField()
+    # Rotation state at the start of this round, as JSON (see rotation_checkpoint)
+    rotation_checkpoint = models.LongStringField(initial='')
 
 def creating_session(subsession: Subsession):
-    session = subsession.session
+    rotation_engine.setup_rotation(subsession, C.NUM_VOTERS)
     if subsession.round_number == 1:
-        participants = session.get_participants()
-        random.shuffle(participants)
-        
-        voter_participants = participants[:C.NUM_VOTERS]
-        rep_pool_participants = participants[C.NUM_VOTERS:]
-
-        session.vars['voter_pids'] = [p.id for p in voter_participants]
-        session.vars['rep_pool_pids'] = [p.id for p in rep_pool_participants]
-        session.vars['removed_pids'] = []
-        
-        if session.vars['rep_pool_pids']:
-            session.vars['current_rep_pid'] = session.vars['rep_pool_pids'].pop(0)
-        else:
-            session.vars['current_rep_pid'] = None
-    
-    voter_pids = session.vars['voter_pids']
-    current_rep_pid = session.vars.get('current_rep_pid')
-    
-    for p in subsession.get_players():
-        pid = p.participant.id
-        if pid in voter_pids:
-            p.is_voter = True
-            p.is_active_rep = False
-        elif pid == current_rep_pid:
-            p.is_voter = False
-            p.is_active_rep = True
-        else:
-            p.is_voter = False
-            p.is_active_rep = False
-
-    active_players = [p for p in subsession.get_players() if p.is_voter or p.is_active_rep]
-    inactive_players = [p for p in subsession.get_players() if not (p.is_voter or p.is_active_rep)]
-    group_matrix = []
-    if active_players: group_matrix.append(active_players)
-    for p in inactive_players: group_matrix.append([p])
-    subsession.set_group_matrix(group_matrix)
+        rotation_checkpoint.save(subsession)
 
 class Group(BaseGroup):
+    cohort = models.IntegerField()
+    rep_was_removed_this_round = models.BooleanField(initial=False)
+    # Live vote tally, kept up to date as votes arrive (see vote_engine)
     num_remove_votes = models.IntegerField(initial=0)
+    num_votes_cast = models.IntegerField(initial=0)
+    vote_resolved = models.BooleanField(initial=False)
 
 class Player(BasePlayer):
+    cohort = models.IntegerField()
     vote_choice = models.BooleanField(label='Do you want to replace the current representative?', choices=[[True, 'Replace'], [False, 'Keep']], widget=widgets.RadioSelect)
     is_voter = models.BooleanField(initial=False)
     is_active_rep = models.BooleanField(initial=False)
@@ -68,91 +43,126 @@ class Player(BasePlayer):
             [2, 'Help'],
         ]
     )
+    # Decisions filled in by a timeout (see timeout_engine)
+    auto_filled = models.StringField(initial='')
 
 
 # --- PAGES ---
 class Status(Page):
     @staticmethod
+    def get_timeout_seconds(player: Player):
+        return timeout_engine.get_timeout_seconds(player, 'info')
+    @staticmethod
     def vars_for_template(player: Player):
+        cohort = rotation_engine.get_cohort(player)
         return {
-            'voter_pids': player.session.vars['voter_pids'],
-            'current_rep_pid': player.session.vars.get('current_rep_pid'),
-            'rep_pool_pids': player.session.vars['rep_pool_pids'],
-            'removed_pids': player.session.vars['removed_pids'],
+            'voter_pids': cohort.voter_pids,
+            'current_rep_pid': cohort.current_rep_pid,
+            'rep_pool_pids': cohort.rep_pool_pids,
+            'removed_pids': cohort.removed_pids,
         }
 
+def apply_vote(group: Group, passed):
+    rep = rotation_engine.get_rep(group)
+    if rep and passed:
+        group.rep_was_removed_this_round = True
+        rep_pid = rep.participant.id
+        rotation_engine.get_cohort(group).remove_rep(rep_pid)
+
 class VotingPage(Page):
-    form_model = 'player'
-    form_fields = ['vote_choice']
+    @staticmethod
+    def live_method(player: Player, data):
+        return vote_engine.live_vote(player, data, C.NUM_VOTERS, apply_vote)
+    @staticmethod
+    def get_timeout_seconds(player: Player):
+        return timeout_engine.get_timeout_seconds(player, 'vote')
+    @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        vote_engine.cast_default_vote(player, timeout_happened, C.NUM_VOTERS, apply_vote)
     @staticmethod
     def is_displayed(player: Player):
-        return player.is_voter and player.session.vars.get('current_rep_pid') is not None
+        return player.is_voter and rotation_engine.get_status(player).current_rep_pid is not None
     @staticmethod
     def vars_for_template(player: Player):
-        return {'active_rep_id': player.session.vars.get('current_rep_pid')}
+        return {'active_rep_id': rotation_engine.get_status(player).current_rep_pid}
 
 class SyncAfterVote(WaitPage):
-    wait_for_all_groups = True
+    # Group-level: the vote is normally resolved already, as the last vote came in.
     @staticmethod
-    def is_displayed(subsession: Subsession):
-        return subsession.session.vars.get('current_rep_pid') is not None
-        
+    def is_displayed(player: Player):
+        return not rotation_engine.on_bench(player) and rotation_engine.get_status(player).current_rep_pid is not None
     @staticmethod
-    def after_all_players_arrive(subsession: Subsession):
-        active_group = next((g for g in subsession.get_groups() if len(g.get_players()) > 1), None)
-        if active_group:
-            rep = next((p for p in active_group.get_players() if p.is_active_rep), None)
-            if rep:
-                voters = [p for p in active_group.get_players() if p.is_voter]
-                replace_votes = sum(1 for v in voters if v.field_maybe_none('vote_choice') is True)
-                active_group.num_remove_votes = replace_votes
-                if replace_votes > (C.NUM_VOTERS / 2):
-                    subsession.rep_was_removed_this_round = True
-                    rep_pid = rep.participant.id
-                    if rep_pid not in subsession.session.vars['removed_pids']:
-                         subsession.session.vars['removed_pids'].append(rep_pid)
+    def after_all_players_arrive(group: Group):
+        # Resolves with the votes cast so far if the vote is still open
+        # (e.g. a voter never voted, or nobody voted this round).
+        if rotation_engine.get_rep(group):
+            vote_engine.resolve(group, C.NUM_VOTERS, apply_vote)
 
 class Stage2Decision(Page):
     form_model = 'player'
     form_fields = ['stage2_decision']
 
+    @staticmethod
+    def get_timeout_seconds(player: Player):
+        return timeout_engine.get_timeout_seconds(player, 'stage2')
+
     @staticmethod
     def is_displayed(player: Player):
-        return player.is_active_rep and player.subsession.rep_was_removed_this_round
+        return player.is_active_rep and player.group.rep_was_removed_this_round
 
     @staticmethod
     def vars_for_template(player: Player):
         return dict(C=C)
 
+    @staticmethod
+    def before_next_page(player: Player, timeout_happened):
+        # Neutral if the rep's timer ran out (see timeout_engine)
+        timeout_engine.fill_defaults(player, 'stage2', timeout_happened)
+
 class PostDecisionWaitPage(WaitPage):
     # This is the new, required wait page
     @staticmethod
     def is_displayed(player: Player):
         # Show this page to everyone IF a removal happened this round
-        return player.subsession.rep_was_removed_this_round
+        return player.group.rep_was_removed_this_round
+
+class BenchWaitForVotes(WaitPage):
+    # Inactive players see their cohort's vote on ResultsPage, so they wait here until
+    # every active group is past SyncAfterVote, where its vote is resolved. The active
+    # groups skip it, so they never wait for the bench.
+    wait_for_all_groups = True
+    @staticmethod
+    def is_displayed(player: Player):
+        return rotation_engine.on_bench(player) and rotation_engine.get_status(player).current_rep_pid is not None
 
 class ResultsPage(Page):
     @staticmethod
+    def get_timeout_seconds(player: Player):
+        return timeout_engine.get_timeout_seconds(player, 'info')
+    @staticmethod
     def is_displayed(player: Player):
-        return player.session.vars.get('current_rep_pid') is not None
+        return rotation_engine.get_status(player).current_rep_pid is not None
     @staticmethod
     def vars_for_template(player: Player):
-        session = player.session
-        active_group = next((g for g in player.subsession.get_groups() if len(g.get_players()) > 1), None)
+        cohort = rotation_engine.get_cohort(player)
+        active_group = rotation_engine.get_active_group(player.subsession, player.cohort)
         
         if active_group:
             replace_votes = active_group.num_remove_votes
-            vote_result = "Replace" if replace_votes > (C.NUM_VOTERS / 2) else "Keep"
+            if vote_engine.vote_passed(active_group, C.NUM_VOTERS):
+                vote_result = "Replace"
+            else:
+                vote_result = "Keep"
         else:
             replace_votes = 0
             vote_result = "N/A"
 
         next_rep_pid = None
         if vote_result == "Keep":
-            next_rep_pid = session.vars.get('current_rep_pid')
+            next_rep_pid = cohort.current_rep_pid
         else:
-            if session.vars['rep_pool_pids']:
-                next_rep_pid = session.vars['rep_pool_pids'][0]
+            if cohort.rep_pool:
+                next_rep_pid = cohort.next_rep_pid
             else:
                 next_rep_pid = "None (Pool is empty)"
 
@@ -167,31 +177,34 @@ class ResultsPage(Page):
 class EndOfRoundWaitPage(WaitPage):
     wait_for_all_groups = True
     @staticmethod
-    def is_displayed(subsession: Subsession):
-        return subsession.session.vars.get('current_rep_pid') is not None
+    def is_displayed(player: Player):
+        return rotation_engine.get_status(player).current_rep_pid is not None
 
     @staticmethod
     def after_all_players_arrive(subsession: Subsession):
-        if subsession.rep_was_removed_this_round:
-            session = subsession.session
-            if session.vars['rep_pool_pids']:
-                session.vars['current_rep_pid'] = session.vars['rep_pool_pids'].pop(0)
-            else:
-                session.vars['current_rep_pid'] = None
+        for active_group in rotation_engine.active_groups(subsession):
+            if active_group.rep_was_removed_this_round:
+                rotation_engine.get_cohort(active_group).promote_next_rep(subsession.round_number + 1)
+        # These apps have no wait page at the start of a round, so the next round's
+        # checkpoint is taken here (see rotation_checkpoint).
+        if subsession.round_number < C.NUM_ROUNDS:
+            rotation_checkpoint.save(subsession.in_round(subsession.round_number + 1))
 
 class EndOfGame(Page):
     @staticmethod
     def is_displayed(player: Player):
-        return player.session.vars.get('current_rep_pid') is None
+        return rotation_engine.get_status(player).current_rep_pid is None
 
 # CORRECTED PAGE SEQUENCE
 page_sequence = [
     Status,
     VotingPage,
     SyncAfterVote,
+    BenchWaitForVotes,
     Stage2Decision,
     PostDecisionWaitPage,
     ResultsPage,
     EndOfRoundWaitPage,
     EndOfGame,
-]
\ No newline at end of file
+]
+journal.attach(page_sequence)
@@ -0,0 +1,10 @@
+from otree.api import *
+from _shared.bots import make_player_bot, check_terms, play_votes
+from . import *
+
+
+# Votes are cast through the live method; the VotingPage then submits itself.
+PlayerBot = make_player_bot(
+    page_sequence, no_button=[VotingPage, EndOfGame], live={VotingPage: play_votes()},
+    checks=[check_terms()],
+)
@@ -0,0 +1,10 @@
+from otree.api import *
+from _shared.bots import make_player_bot, check_terms
+from . import *
+
+
+# SliderTask ends on its timer in the lab, so the bots let it time out as well.
+PlayerBot = make_player_bot(
+    page_sequence, timeouts=[SliderTask], no_button=[EndOfGame],
+    checks=[check_terms()],
+)
@@ -1,7 +1,26 @@
 SESSION_CONFIG_DEFAULTS = dict(
     real_world_currency_per_point=1.0, 
     participation_fee=0.0,
-    slider_timeout=60
+    slider_timeout=60,
+    # Rotation treatments: number of independent cohorts (parallel polities) per session
+    num_cohorts=1,
+    # Rule for removing the rep by vote: 'majority', 'supermajority' (2/3) or 'unanimity'
+    vote_rule='majority',
+    # Multiplies every page timeout (see _shared/timeout_engine.py), e.g. 0.25 for rehearsals
+    timeout_scale=1.0,
+    # Missed pages in a row (SliderTask or decision pages timed out without the browser
+    # answering) after which a participant counts as dropped out and is replaced in the
+    # rotation treatments (see _shared/dropout_engine.py); 0 turns this off
+    dropout_missed_pages=3,
+    # Journal every submission and live message to journal/<session_code>.jsonl (see _shared/journal.py);
+    # on in the debug configs only, so a session with real participants writes no journal unless asked to
+    journal=False,
+    # Rotation treatments: write each round's cohorts as the round starts rather than all at
+    # session creation. oTree still creates every round's rows up front, so this only makes
+    # session creation about a quarter faster (see _shared/round_engine.py)
+    lazy_rounds=False,
+    # Each session draws a seed for all its random draws, recorded in session.vars['random_seed'];
+    # add random_seed=<seed> to a session config to replay one (see _shared/rng_engine.py)
 )
 
 PARTICIPANT_FIELDS = [
@@ -55,38 +74,64 @@ SESSION_CONFIGS = [
         display_name="DEBUG: Dictator Game Only",
         num_demo_participants=2,
         app_sequence=['app_0_dictator'],
+        journal=True,
     ),
     dict(
         name='debug_ultimatum',
         display_name="DEBUG: Ultimatum Game Only",
         num_demo_participants=2,
         app_sequence=['app_1_ultimatum'],
+        journal=True,
     ),
     dict(
         name='debug_jod',
         display_name="DEBUG: Joy of Destruction Only",
         num_demo_participants=2,
         app_sequence=['app_2_jod'],
+        journal=True,
     ),
     dict(
         name='debug_treatment_1',
         display_name="DEBUG: Treatment 1 Only",
         num_demo_participants=6,
         app_sequence=['app_3_treatment1'],
+        journal=True,
         slider_task_timeout=15,
     ),
+    dict(
+        name='debug_dropout',
+        display_name="DEBUG: Treatment 1, a Rep Drops Out",
+        num_demo_participants=6,
+        app_sequence=['app_3_treatment1'],
+        journal=True,
+        slider_task_timeout=15,
+        # Below the term limit, so a rep who leaves is substituted before their term ends
+        dropout_missed_pages=2,
+    ),
     dict(
         name='debug_treatment_2a',
         display_name="DEBUG: Treatment 2a Only",
         num_demo_participants=6,
         app_sequence=['app_4_treatment2a'],
+        journal=True,
+        slider_task_timeout=15,
+    ),
+    dict(
+        name='debug_cohorts',
+        display_name="DEBUG: Treatment 2a, Two Cohorts",
+        num_demo_participants=8,
+        app_sequence=['app_4_treatment2a'],
+        journal=True,
         slider_task_timeout=15,
+        # In the bots' early_end case cohort 0's game ends while cohort 1 plays on
+        num_cohorts=2,
     ),
     dict(
         name='debug_treatment_2b',
         display_name="DEBUG: Treatment 2b Only",
         num_demo_participants=6,
         app_sequence=['app_5_treatment2b'],
+        journal=True,
         slider_task_timeout=15,
     ),
     dict(
@@ -94,8 +139,30 @@ SESSION_CONFIGS = [
         display_name="DEBUG: Treatment 3 Only",
         num_demo_participants=6,
         app_sequence=['app_6_treatment3'],
+        journal=True,
         slider_task_timeout=15,
     ),
+    dict(
+        name='debug_rotation',
+        display_name="DEBUG: Rotation (app 7) Only",
+        num_demo_participants=6,
+        app_sequence=['app_7_rotation'],
+        journal=True,
+    ),
+    dict(
+        name='debug_reaction',
+        display_name="DEBUG: Reaction (app 8) Only",
+        num_demo_participants=6,
+        app_sequence=['app_8_reaction'],
+        journal=True,
+    ),
+    dict(
+        name='debug_working_no_mods',
+        display_name="DEBUG: Working, No Mods (app 9) Only",
+        num_demo_participants=6,
+        app_sequence=['app_9_working_no_mods'],
+        journal=True,
+    ),
 ]
 
 # Standard oTree Settings
@@ -126,4 +193,7 @@ INSTALLED_APPS = [
     'app_4_treatment2a', 
     'app_5_treatment2b', 
     'app_6_treatment3',
+    'app_7_rotation',
+    'app_8_reaction',
+    'app_9_working_no_mods',
 ]
\ No newline at end of file